@@ -25,7 +25,9 @@ INSTALLED_APPS = [
 
 # ---- Middleware ----
 MIDDLEWARE = [
+    "routes.instrumentation.PerformanceMiddleware",  # first, so it times everything below
     "django.middleware.security.SecurityMiddleware",
+    "routes.db_routing.ReplicaRoutingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -42,7 +44,8 @@ ASGI_APPLICATION = "ClimbApp.asgi.application"
 # ---- Templates (global templates/ folder) ----
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates plus render timing for routes.instrumentation
+        "BACKEND": "routes.instrumentation.TimedDjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],  # <— global templates
         "APP_DIRS": True,
         "OPTIONS": {
@@ -61,6 +64,14 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Keep connections between requests (pragmas run once per connection),
+        # checking they still work before reuse
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 600)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            # Take the write lock at BEGIN, so busy_timeout applies (routes.sqlite_tuning)
+            "transaction_mode": "IMMEDIATE",
+        },
     }
 }
 
@@ -93,3 +104,133 @@ MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# ---- Server-side geocoding cache (routes.geocoding) ----
+GEOCODE_CACHE_TTL_DAYS = 90       # successful lookups
+GEOCODE_NEGATIVE_TTL_HOURS = 24   # "no match" results
+GEOCODE_CACHE_MAX_ENTRIES = 10000
+GEOCODE_MAX_WORKERS = 4           # thread pool size for concurrent lookups
+GEOCODE_MAX_PENDING = 50          # queued lookups per process; further misses wait for a later search
+GEOCODE_REQUESTS_PER_SECOND = 1.0  # per process; Nominatim allows 1 req/s in total
+
+# How route_search handles text-only routes that lack stored coordinates:
+#   "cache"      -> use cached geocodes only, never the network (default)
+#   "concurrent" -> also look up cache misses in the thread pool, waiting at
+#                   most ROUTE_SEARCH_GEOCODE_BUDGET seconds per request
+ROUTE_SEARCH_GEOCODE_MODE = "cache"
+ROUTE_SEARCH_GEOCODE_BUDGET = 2.0
+
+# ---- Home map clustering (routes.clustering) ----
+# At or below this zoom the map gets server-side clusters instead of markers.
+# Tiles live in this cache alias. Invalidation only reaches the process that
+# saved the route unless the alias is a shared backend (Redis, Memcached), so
+# with the per-process locmem "default" the TTL is what bounds how long other
+# workers serve stale clusters; raise it once the alias is shared.
+ROUTE_CLUSTER_MAX_ZOOM = 9
+ROUTE_CLUSTER_TILE_TTL = 300
+ROUTE_CLUSTER_CACHE_ALIAS = "default"
+
+# ---- Image processing jobs (routes.jobs) ----
+# "queue": uploads are processed by `manage.py process_image_jobs` workers
+# "sync":  processed inline during the request (no worker needed)
+IMAGE_JOBS_MODE = "queue"
+IMAGE_JOBS_MAX_ATTEMPTS = 3
+
+# ---- Route photo uploads (routes.uploads) ----
+# Enforced while the request body streams in; oversized files are dropped early.
+ROUTE_IMAGE_MAX_BYTES = 15 * 1024 * 1024    # per file
+ROUTE_UPLOAD_MAX_BYTES = 60 * 1024 * 1024   # all files in one request
+# Unreferenced photos written more recently than this are kept (an identical
+# upload may be about to use them); `manage.py gc_route_images` removes the rest.
+ROUTE_IMAGE_ORPHAN_GRACE_SECONDS = 60 * 60
+
+# ---- Search-box suggestions (routes.typeahead) ----
+# Each process keeps its own prefix index; this cache alias carries the version
+# counter that tells other processes to rebuild, so share it across workers.
+ROUTE_TYPEAHEAD_CACHE_ALIAS = "default"
+ROUTE_TYPEAHEAD_REBUILD_SECONDS = 15 * 60
+
+# ---- Page cache (routes.page_cache) ----
+# Whole-response cache for route_list, route_detail and the anonymous home page.
+# PAGE_CACHE_BACKEND: "locmem" (per process), "file" (shared on one host) or
+# "redis" (shared; needs the redis package and a server at PAGE_CACHE_REDIS_URL).
+PAGE_CACHE_BACKEND = os.environ.get("PAGE_CACHE_BACKEND", "locmem")
+_PAGE_CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "climbapp-pages",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".cache" / "pages",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("PAGE_CACHE_REDIS_URL", "redis://127.0.0.1:6379/1"),
+    },
+}
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "pages": _PAGE_CACHE_BACKENDS[PAGE_CACHE_BACKEND],
+}
+PAGE_CACHE_ALIAS = "pages"
+PAGE_CACHE_TIMEOUT = 300
+
+# ---- SQLite tuning (routes.sqlite_tuning) ----
+# Run on every new connection. Compare settings with `manage.py bench_sqlite_writes`.
+SQLITE_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "busy_timeout": 5000,            # ms
+    "cache_size": -64 * 1024,        # KiB (negative) -> 64 MiB
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "memory",
+}
+
+# ---- Read replica (routes.db_routing) ----
+# With DB_REPLICA_NAME set (e.g. a copy kept fresh by `manage.py sync_sqlite_replica`),
+# the read-only pages read routes/accounts data from it; writes, and reads for
+# DATABASE_REPLICA_PIN_SECONDS after a user's write, stay on the primary.
+if os.environ.get("DB_REPLICA_NAME"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": os.environ["DB_REPLICA_NAME"],
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["routes.db_routing.PrimaryReplicaRouter"]
+DATABASE_REPLICA_ALIAS = "replica"
+DATABASE_REPLICA_APPS = ["routes", "accounts"]
+DATABASE_REPLICA_PIN_SECONDS = 5
+
+# ---- Request instrumentation (routes.instrumentation) ----
+# Per-view query counts and timings, shown at admin/performance/.
+# SERVER_TIMING: who gets a Server-Timing header ("all", "staff" or "off").
+SERVER_TIMING = "staff"
+# Max SQL queries per URL name, including the session/auth lookups and the
+# BEGIN/COMMIT/SAVEPOINT statements of write paths. Measured worst branch +
+# 1-2 headroom; over-budget requests are logged, and raise in tests that set
+# VIEW_QUERY_BUDGETS_STRICT.
+VIEW_QUERY_BUDGETS = {
+    "home": 4,                        # 3
+    "routes:list": 6,                 # 4
+    "routes:detail": 10,              # 8
+    "routes:search": 7,               # 5
+    "routes:map_data": 8,             # 6
+    "routes:suggest": 3,              # 1 (0 when answered from the index)
+    "routes:my_routes": 5,            # 3
+    "routes:my_favorite_routes": 5,   # 3
+    "accounts:profile": 5,            # 3
+    # Writes: new vote 5, switch 6-7, take back 7-8
+    "routes:vote": 9,
+    "routes:toggle_favorite": 7,      # on 5, off 6
+    # About 4 + 3 per uploaded image: 9 images (the maximum) take 34
+    "routes:add": 36,
+    # Field edits 13; replacing and reordering all 9 images 52
+    "routes:edit": 55,
+    # About 3 + 3.3 per distinct route: a 10-route sync with votes and
+    # favorites takes 36. Bigger batches (up to 200 operations) are logged.
+    "routes:bulk_interactions": 40,
+}
+VIEW_QUERY_BUDGETS_STRICT = False
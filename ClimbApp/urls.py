@@ -6,6 +6,7 @@ from django.conf.urls.static import static
 from . import views
 
 urlpatterns = [
+    path("admin/performance/", views.performance_stats, name="performance_stats"),
     path("admin/", admin.site.urls),
     path("", views.home, name="home"),
 
@@ -1,34 +1,16 @@
-from django.shortcuts import render
-from django.db.models import Q
-from routes.models import Route
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.shortcuts import redirect, render
+
+from routes import db_routing, geocoding, instrumentation, page_cache
 
-def home(request):
-    # Include routes that already have coordinates OR at least have a location string
-    routes_qs = (
-        Route.objects
-        .filter(
-            Q(latitude__isnull=False, longitude__isnull=False) |
-            (Q(location_name__isnull=False) & ~Q(location_name__exact=""))
-        )
-        .select_related("author")
-        .prefetch_related("favorites", "votes")
-    )
 
-    # Serialize what the template expects
-    routes_data = [{
-        "pk": r.pk,
-        "title": r.title,
-        "description": r.description,
-        "difficulty": r.difficulty,
-        "author": r.author.get_username(),
-        "location_name": r.location_name or "",
-        "latitude": float(r.latitude) if r.latitude is not None else None,
-        "longitude": float(r.longitude) if r.longitude is not None else None,
-        "is_favorited": r.is_favorited_by(request.user),
-        "upvotes_count": r.get_upvotes_count(),
-        "downvotes_count": r.get_downvotes_count(),
-        "user_vote": r.get_user_vote(request.user),
-    } for r in routes_qs]
+# Anonymous visitors all get the same shell page (routes arrive via AJAX)
+@db_routing.replica_reads
+@page_cache.cached_page(lambda request: [page_cache.CATALOG], anonymous_only=True)
+def home(request):
+    # Routes are loaded by the map itself from routes:map_data for the visible
+    # bounding box, so first paint doesn't grow with the catalog.
 
     # (optional) user location if you have it
     user_location = None
@@ -42,6 +24,20 @@ def home(request):
             }
 
     return render(request, "home.html", {
-        "routes": routes_data,
         "user_location": user_location,
     })
+
+
+@staff_member_required
+def performance_stats(request):
+    """Per-view query counts and timings (this process), plus the cache counters."""
+    if request.method == "POST":
+        instrumentation.reset_stats()
+        return redirect("performance_stats")
+    return render(request, "admin/performance.html", {
+        **admin.site.each_context(request),
+        "title": "Performance",
+        "views": instrumentation.stats(),
+        "page_cache": page_cache.stats(),
+        "geocoding": geocoding.stats(),
+    })
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Route, RouteImage
+from .models import Route, RouteImage, GeocodeCacheEntry, ImageJob
 
 class RouteImageInline(admin.TabularInline):
     model = RouteImage
@@ -18,3 +18,14 @@ class RouteAdmin(admin.ModelAdmin):
 class RouteImageAdmin(admin.ModelAdmin):
     list_display = ("route", "order", "alt_text")
     list_editable = ("order",)
+
+@admin.register(GeocodeCacheEntry)
+class GeocodeCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ("key", "latitude", "longitude", "expires_at")
+    search_fields = ("key",)
+
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "route", "route_image", "status", "attempts", "created_at", "finished_at")
+    list_filter = ("status",)
+    readonly_fields = ("error",)
@@ -0,0 +1,170 @@
+"""
+Server-side marker clustering for the home map at low zoom levels.
+
+The world is cut into square lat/lng tiles (360 / 2**zoom degrees wide), each
+tile into CELLS_PER_TILE x CELLS_PER_TILE cells. Routes in a cell become one
+cluster carrying a count, a centroid and a difficulty histogram. Clusters are
+computed per tile with a GROUP BY and cached; saving or deleting a Route drops
+the tiles that contain its old and new position at every clustered zoom, when
+the change commits (so a tile can't be recomputed from the old rows first).
+"""
+import math
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Avg, Count, F, Q
+from django.db.models.functions import Floor
+
+CLUSTER_MAX_ZOOM = getattr(settings, "ROUTE_CLUSTER_MAX_ZOOM", 9)
+CELLS_PER_TILE = 8
+TILE_TTL = getattr(settings, "ROUTE_CLUSTER_TILE_TTL", 300)  # bounds staleness where invalidation can't reach
+MAX_TILES_PER_REQUEST = 256
+
+_VERSION_KEY = "route-clusters:version"
+
+
+def _cache():
+    return caches[getattr(settings, "ROUTE_CLUSTER_CACHE_ALIAS", "default")]
+
+
+def tile_size(zoom: int) -> float:
+    return 360.0 / (2 ** zoom)
+
+
+def tile_for_point(lat: float, lng: float, zoom: int) -> tuple[int, int]:
+    """(x, y) of the tile containing a point; x counts from -180 lng, y from -90 lat."""
+    size = tile_size(zoom)
+    n_x = 2 ** zoom
+    x = int(math.floor((lng + 180.0) / size)) % n_x
+    y = int(math.floor((min(max(lat, -90.0), 90.0) + 90.0) / size))
+    return x, y
+
+
+def _tile_key(version: int, zoom: int, x: int, y: int) -> str:
+    return f"route-clusters:{version}:{zoom}:{x}:{y}"
+
+
+def _version() -> int:
+    cache = _cache()
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        cache.add(_VERSION_KEY, 1, timeout=None)
+        version = cache.get(_VERSION_KEY, 1)
+    return version
+
+
+def tiles_for_bbox(west: float, south: float, east: float, north: float, zoom: int):
+    """
+    Tile coordinates covering a box. Longitudes are expected normalized to
+    [-180, 180); west > east means the box crosses the antimeridian.
+    Returns None if the box would need more than MAX_TILES_PER_REQUEST tiles.
+    """
+    n_x = 2 ** zoom
+    _, y0 = tile_for_point(south, 0.0, zoom)
+    _, y1 = tile_for_point(north, 0.0, zoom)
+    x0, _ = tile_for_point(0.0, west, zoom)
+    x1, _ = tile_for_point(0.0, east, zoom)
+    xs = list(range(x0, x1 + 1)) if x0 <= x1 else list(range(x0, n_x)) + list(range(0, x1 + 1))
+    if len(xs) * (y1 - y0 + 1) > MAX_TILES_PER_REQUEST:
+        return None
+    return [(x, y) for x in xs for y in range(y0, y1 + 1)]
+
+
+def _compute_tiles(zoom: int, tiles) -> dict:
+    """GROUP BY over the rectangle spanning `tiles`; returns {(x, y): [cluster, ...]}."""
+    from .models import Route
+
+    size = tile_size(zoom)
+    cell = size / CELLS_PER_TILE
+    wanted = set(tiles)
+    result = {t: [] for t in tiles}
+
+    # Group requested tiles into runs of contiguous x so a wrapped box is two queries
+    xs = sorted({x for x, _ in tiles})
+    ys = [y for _, y in tiles]
+    runs, start = [], xs[0]
+    for prev, cur in zip(xs, xs[1:] + [None]):
+        if cur != prev + 1:
+            runs.append((start, prev))
+            start = cur
+
+    histogram = {
+        f"d{level}": Count("id", filter=Q(difficulty=level)) for level in range(1, 11)
+    }
+    for x0, x1 in runs:
+        rows = (
+            Route.objects
+            .filter(
+                latitude__gte=min(ys) * size - 90.0, latitude__lt=(max(ys) + 1) * size - 90.0,
+                longitude__gte=x0 * size - 180.0, longitude__lt=(x1 + 1) * size - 180.0,
+            )
+            .order_by()
+            .annotate(
+                cy=Floor((F("latitude") + 90.0) / cell),
+                cx=Floor((F("longitude") + 180.0) / cell),
+            )
+            .values("cy", "cx")
+            .annotate(count=Count("id"), lat=Avg("latitude"), lng=Avg("longitude"), **histogram)
+        )
+        for row in rows:
+            key = (int(row["cx"]) // CELLS_PER_TILE, int(row["cy"]) // CELLS_PER_TILE)
+            if key not in wanted:
+                continue
+            result[key].append({
+                "lat": round(row["lat"], 5),
+                "lng": round(row["lng"], 5),
+                "count": row["count"],
+                "difficulty": {
+                    str(level): row[f"d{level}"] for level in range(1, 11) if row[f"d{level}"]
+                },
+            })
+    return result
+
+
+def clusters_for_bbox(west: float, south: float, east: float, north: float, zoom: int):
+    """
+    Clusters inside a box at the given zoom, served from cached tiles where
+    possible. Returns None when the box is too large to cluster tile by tile.
+    """
+    tiles = tiles_for_bbox(west, south, east, north, zoom)
+    if tiles is None:
+        return None
+
+    cache = _cache()
+    version = _version()
+    keys = {_tile_key(version, zoom, x, y): (x, y) for x, y in tiles}
+    cached = cache.get_many(list(keys))
+
+    missing = [tile for key, tile in keys.items() if key not in cached]
+    if missing:
+        computed = _compute_tiles(zoom, missing)
+        cache.set_many(
+            {_tile_key(version, zoom, x, y): clusters for (x, y), clusters in computed.items()},
+            timeout=TILE_TTL,
+        )
+        cached.update({_tile_key(version, zoom, x, y): c for (x, y), c in computed.items()})
+
+    clusters = []
+    for key in keys:
+        clusters.extend(cached.get(key, []))
+    return clusters
+
+
+def invalidate_point(lat, lng) -> None:
+    """Drop the cached tiles containing a point at every clustered zoom."""
+    if lat is None or lng is None:
+        return
+    version = _version()
+    _cache().delete_many([
+        _tile_key(version, zoom, *tile_for_point(float(lat), float(lng), zoom))
+        for zoom in range(CLUSTER_MAX_ZOOM + 1)
+    ])
+
+
+def invalidate_all() -> None:
+    """Drop every cached tile (after bulk updates that bypass model signals)."""
+    cache = _cache()
+    try:
+        cache.incr(_VERSION_KEY)
+    except ValueError:
+        cache.set(_VERSION_KEY, 1, timeout=None)
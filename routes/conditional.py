@@ -0,0 +1,104 @@
+"""
+Validators for conditional GETs (ETag / Last-Modified -> 304 Not Modified).
+
+route_detail is validated by the route's own change markers (updated_at,
+votes_changed_at), fetched with one small query by primary key. The map
+payload is validated by an aggregate over the requested bounding box
+(count plus the newest markers), which is far cheaper than building the
+JSON. At clustered zooms the box can cover the whole catalog, so it is
+validated by the page cache's catalog version instead (no query at all).
+
+ETags include the viewer's session, like page cache keys (pages show their
+own votes and favorites, and the CSRF token rotates on login), and
+nothing is validated while flash messages are pending, so a 304 never
+hides one.
+"""
+import hashlib
+from functools import wraps
+
+from django.contrib import messages
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from . import page_cache
+
+
+def _skip(request) -> bool:
+    return request.method not in ("GET", "HEAD") or bool(len(messages.get_messages(request)))
+
+
+def _etag(*parts) -> str:
+    return hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:20]
+
+
+# ---- route_detail ----
+def _route_markers(request, pk):
+    """(updated_at, votes_changed_at) for the route, memoized on the request."""
+    cached = getattr(request, "_route_markers", None)
+    if cached is None or cached[0] != pk:
+        from .models import Route
+
+        markers = (
+            Route.objects.filter(pk=pk).values_list("updated_at", "votes_changed_at").first()
+        )
+        cached = (pk, markers)
+        request._route_markers = cached
+    return cached[1]
+
+
+def route_detail_etag(request, pk):
+    if _skip(request):
+        return None
+    markers = _route_markers(request, pk)
+    if markers is None:
+        return None  # let the view 404
+    return _etag("route", pk, page_cache.audience(request), *(m.isoformat() for m in markers))
+
+
+def route_detail_last_modified(request, pk):
+    if _skip(request):
+        return None
+    markers = _route_markers(request, pk)
+    return max(markers) if markers else None
+
+
+# ---- map payload ----
+def map_data_etag(request, queryset, clustered: bool):
+    if _skip(request):
+        return None
+    if clustered:
+        state = page_cache.catalog_version()
+    else:
+        agg = queryset.order_by().aggregate(
+            n=Count("id"), updated=Max("updated_at"), votes=Max("votes_changed_at"),
+        )
+        state = (agg["n"], agg["updated"], agg["votes"])
+    return _etag("map", request.META.get("QUERY_STRING", ""), page_cache.audience(request), state)
+
+
+def finalize(request, response):
+    """Headers shared by conditionally-served responses (200s and 304s)."""
+    patch_vary_headers(response, ("Cookie",))
+    # Always revalidate; logged-in variants must not be stored by shared caches
+    if request.user.is_authenticated:
+        patch_cache_control(response, no_cache=True, private=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def conditional_page(etag_func, last_modified_func=None):
+    """django.views.decorators.http.condition plus the headers from finalize()."""
+    def decorator(view):
+        conditioned = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            response = conditioned(request, *args, **kwargs)
+            if response.has_header("ETag") or response.status_code == 304:
+                finalize(request, response)
+            return response
+
+        return wrapped
+    return decorator
@@ -0,0 +1,109 @@
+"""
+Primary/replica routing for the read-heavy pages.
+
+Views decorated with @replica_reads (home, route_list, route_detail,
+route_search, route_map_data) read the REPLICA_APPS models from the
+DATABASE_REPLICA_ALIAS database when one is configured. Everything else,
+and every write, goes to the primary ("default"). Reads fall back to the
+primary:
+- for the rest of a request once it has written to a replicated model,
+- inside a transaction on the primary,
+- for PIN_SECONDS after a request that wrote or wasn't a GET/HEAD (a short
+  cookie set by ReplicaRoutingMiddleware), so the page a user lands on
+  after voting or editing shows their change even if the replica lags.
+
+auth and sessions are never replicated reads, so logging in takes effect at
+once. Pages the page cache stores while the replica lags can be that stale
+until the next invalidation or PAGE_CACHE_TIMEOUT.
+
+For local testing the replica can be a copy of the SQLite file, refreshed
+with `manage.py sync_sqlite_replica` (set DB_REPLICA_NAME to its path).
+"""
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_ALIAS = getattr(settings, "DATABASE_REPLICA_ALIAS", "replica")
+REPLICA_APPS = frozenset(getattr(settings, "DATABASE_REPLICA_APPS", ("routes", "accounts")))
+PIN_SECONDS = getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 5)
+PIN_COOKIE = "db_primary_pin"
+
+_SAFE_METHODS = ("GET", "HEAD")
+# Per request: {"replica_ok": bool, "pinned": bool, "wrote": bool}; None outside the middleware
+_state = ContextVar("db_routing_state", default=None)
+
+
+def replica_configured() -> bool:
+    return REPLICA_ALIAS in connections.settings
+
+
+def _replicated(model) -> bool:
+    return model._meta.app_label in REPLICA_APPS
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (
+            state is not None
+            and state["replica_ok"]
+            and not (state["pinned"] or state["wrote"])
+            and _replicated(model)
+            and replica_configured()
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return REPLICA_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and _replicated(model):
+            state["wrote"] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Same data on both sides
+        aliases = {DEFAULT_DB_ALIAS, REPLICA_ALIAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema with the data, from the primary
+        return db != REPLICA_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """Tracks per-request routing state and the read-your-writes cookie."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = {"replica_ok": False, "pinned": PIN_COOKIE in request.COOKIES, "wrote": False}
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if replica_configured() and (state["wrote"] or request.method not in _SAFE_METHODS):
+            response.set_cookie(PIN_COOKIE, "1", max_age=PIN_SECONDS, httponly=True, samesite="Lax")
+        return response
+
+
+def replica_reads(view):
+    """Let a read-only view's queries go to the replica (see the module docstring)."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        state = _state.get()
+        if state is None or request.method not in _SAFE_METHODS:
+            return view(request, *args, **kwargs)
+        state["replica_ok"] = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state["replica_ok"] = False
+
+    return wrapped
@@ -0,0 +1,43 @@
+"""
+Parsing for the YouTube and Google Maps embeds on route pages.
+
+This runs once when a Route is saved (see set_route_embeds in routes.models);
+templates then only read Route.youtube_id / Route.map_embed_url.
+"""
+import re
+from urllib.parse import quote_plus
+
+# watch?v= / youtu.be / embed / shorts / live, on www., m. or bare youtube.com.
+# Real ids are 11 characters; anything longer than Route.youtube_id holds isn't one.
+_YOUTUBE_ID_RE = re.compile(
+    r"(?:youtube\.com/watch\?[^#]*?\bv=|youtu\.be/|youtube\.com/(?:embed|shorts|live)/)"
+    r"([A-Za-z0-9_-]{6,32})(?![A-Za-z0-9_-])"
+)
+YOUTUBE_EMBED_PARAMS = "rel=0&modestbranding=1&playsinline=1&iv_load_policy=3"
+
+
+def parse_youtube_id(url: str | None) -> str:
+    """Video id from the common YouTube URL shapes, or "" if there isn't one."""
+    if not url:
+        return ""
+    match = _YOUTUBE_ID_RE.search(url.strip())
+    return match.group(1) if match else ""
+
+
+def map_embed_url(latitude, longitude, location_name: str | None) -> str:
+    """
+    Embeddable Google Maps URL: precise lat/long when valid, otherwise a
+    search by location name; "" if neither is usable.
+    """
+    try:
+        lat = float(latitude) if latitude is not None else None
+        lng = float(longitude) if longitude is not None else None
+    except (TypeError, ValueError):
+        lat = lng = None
+    if lat is not None and lng is not None and -90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0:
+        return f"https://www.google.com/maps?q={lat},{lng}&z=14&output=embed"
+
+    name = (location_name or "").strip()
+    if name:
+        return f"https://www.google.com/maps?q={quote_plus(name)}&z=14&output=embed"
+    return ""
@@ -1,5 +1,8 @@
 from django import forms
 from django.core.exceptions import ValidationError
+from django.db.models import Value
+from django.db.models.functions import Lower
+from .geocoding import geocode_route
 from .models import Route, RouteImage
 
 
@@ -28,10 +31,20 @@ class MultiFileField(forms.FileField):
 
 class RouteForm(forms.ModelForm):
     # Inject request.user via __init__ so we can check per-user uniqueness
-    def __init__(self, *args, user=None, is_edit=False, **kwargs):
+    def __init__(self, *args, user=None, is_edit=False, upload_errors=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.user = user
         self.is_edit = is_edit
+        # Files routes.uploads rejected while streaming (too large, not an image)
+        self.upload_errors = upload_errors or []
+
+        # Coordinates we derived from the location text aren't the user's input;
+        # show the text only, and reuse these on save if the text is unchanged.
+        self._geocoded_coords = None
+        if self.instance.pk and self.instance.coords_geocoded:
+            self._geocoded_coords = (self.instance.latitude, self.instance.longitude)
+            self.initial["latitude"] = None
+            self.initial["longitude"] = None
         
         # Make images optional when editing
         if is_edit:
@@ -76,7 +89,7 @@ class RouteForm(forms.ModelForm):
     images = MultiFileField(
         required=False,
         widget=MultipleFileInput(attrs={"multiple": True}),
-        help_text="Upload 1 to 9 images."
+        help_text="Upload 1 to 9 images (JPEG, PNG, GIF or WebP)."
     )
 
     class Meta:
@@ -93,8 +106,9 @@ class RouteForm(forms.ModelForm):
         if not v:
             raise forms.ValidationError("Please add a title.")
         # Need the current user to check duplicates
-        if self.user and Route.objects.filter(
-            author=self.user, title__iexact=v
+        # lower(title) = lower(v) rather than iexact, so route_author_title_ci_idx applies
+        if self.user and Route.objects.alias(title_ci=Lower("title")).filter(
+            author=self.user, title_ci=Lower(Value(v))
         ).exclude(pk=self.instance.pk).exists():
             raise forms.ValidationError("You already have a route with this title.")
         return v
@@ -138,6 +152,9 @@ class RouteForm(forms.ModelForm):
         if has_name and has_coords:
             cleaned["location_name"] = ""  # prefer coords if both provided
 
+        for message in self.upload_errors:
+            self.add_error("images", message)
+
        # Enforce 1..9 images (but only for new routes, not edits)
         files = self.cleaned_data.get("images") or []
         if not self.is_edit:  # Only require images for new routes
@@ -151,6 +168,25 @@ class RouteForm(forms.ModelForm):
 
         return cleaned
 
+    def save(self, commit=True):
+        route = super().save(commit=False)
+
+        # Geocoding stage: text-only locations get coordinates at write time,
+        # so search and the map never need to look them up per request.
+        if route.latitude is not None and route.longitude is not None:
+            route.coords_geocoded = False
+        elif route.location_name:
+            if self._geocoded_coords and "location_name" not in self.changed_data:
+                route.latitude, route.longitude = self._geocoded_coords
+                route.coords_geocoded = True
+            else:
+                geocode_route(route)
+
+        if commit:
+            route.save()
+            self.save_m2m()
+        return route
+
     def clean_video_url(self):
         url = (self.cleaned_data.get("video_url") or "").strip()
         if not url:
@@ -158,3 +194,52 @@ class RouteForm(forms.ModelForm):
         if "youtube.com" not in url and "youtu.be" not in url:
             raise forms.ValidationError("Please provide a YouTube URL.")
         return url
+
+
+class RouteImagesEditForm(forms.Form):
+    """
+    Per-image controls on the edit page: remove, position and replace for
+    each existing image. New uploads come through RouteForm.images and are
+    appended; `adding` is their count so the 1..9 total can be checked here.
+    """
+    def __init__(self, *args, route=None, adding=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.route_images = list(route.images.all()) if route else []
+        self.adding = adding
+        for img in self.route_images:
+            self.fields[f"remove_{img.pk}"] = forms.BooleanField(required=False, label="Remove")
+            self.fields[f"order_{img.pk}"] = forms.IntegerField(
+                required=False, min_value=1, initial=img.order, label="Position",
+                widget=forms.NumberInput(attrs={"min": 1, "style": "width: 4em"}),
+            )
+            self.fields[f"replace_{img.pk}"] = forms.ImageField(required=False, label="Replace")
+
+    def rows(self):
+        """(image, remove, order, replace) bound fields for the template."""
+        for img in self.route_images:
+            yield img, self[f"remove_{img.pk}"], self[f"order_{img.pk}"], self[f"replace_{img.pk}"]
+
+    def clean(self):
+        cleaned = super().clean()
+        kept = sum(1 for img in self.route_images if not cleaned.get(f"remove_{img.pk}"))
+        total = kept + self.adding
+        if total == 0:
+            raise ValidationError("A route needs at least one image.")
+        if total > 9:
+            raise ValidationError(f"A route can have at most 9 images ({total} selected).")
+        return cleaned
+
+    def edits(self) -> dict:
+        """Keyword arguments for gallery.apply_image_edits (only what changed)."""
+        remove, replace, orders = [], {}, {}
+        for img in self.route_images:
+            if self.cleaned_data.get(f"remove_{img.pk}"):
+                remove.append(img.pk)
+                continue
+            upload = self.cleaned_data.get(f"replace_{img.pk}")
+            if upload:
+                replace[img.pk] = upload
+            order = self.cleaned_data.get(f"order_{img.pk}")
+            if order is not None and order != img.order:
+                orders[img.pk] = order
+        return {"remove": remove, "replace": replace, "orders": orders}
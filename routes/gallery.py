@@ -0,0 +1,105 @@
+"""
+Incremental edits to a route's images: add, remove, reorder, replace one.
+
+Each operation touches only the rows and files that actually change, so
+editing one photo on a nine-photo route leaves the other eight (and their
+variants) alone. Files are released through the RouteImage signals and
+routes.images, which keep shared content-addressed files until unused.
+"""
+from django.db import transaction
+
+from . import images
+from .models import Route, RouteImage
+
+MAX_IMAGES = 9
+
+
+def store_upload(upload) -> str:
+    """
+    Write an upload to image storage now and return its stored name. Views do
+    this before opening a transaction (which takes SQLite's write lock), then
+    hand the names to the functions below, which only write rows.
+    """
+    field = RouteImage._meta.get_field("image")
+    name = field.generate_filename(None, upload.name)
+    return field.storage.save(name, upload, max_length=field.max_length)
+
+
+def add_images(route, files) -> list:
+    """Append uploads (or stored names, see store_upload) after the route's current last image."""
+    last = route.images.order_by("-order").values_list("order", flat=True).first() or 0
+    return [
+        RouteImage.objects.create(route=route, image=f, order=last + idx)
+        for idx, f in enumerate(files, start=1)
+    ]
+
+
+def remove_images(route, image_ids) -> int:
+    """Delete the given images of this route; files are GC'd on commit."""
+    if not image_ids:
+        return 0
+    deleted, _ = route.images.filter(pk__in=image_ids).delete()
+    return deleted
+
+
+def reorder_images(route, orders: dict) -> int:
+    """
+    Apply {image_id: order}. Positions are renumbered 1..n in the requested
+    order (on a tie the image that was moved goes first) and only rows whose
+    `order` changes are written, in one bulk UPDATE that skips post_save hooks.
+    """
+    current = list(RouteImage.objects.filter(route=route))  # not the (possibly stale) prefetch
+    ranked = sorted(current, key=lambda img: (
+        orders.get(img.pk, img.order), img.pk not in orders, img.order, img.pk
+    ))
+    changed = []
+    for position, img in enumerate(ranked, start=1):
+        if img.order != position:
+            img.order = position
+            changed.append(img)
+    if changed:
+        RouteImage.objects.bulk_update(changed, ["order"])
+    return len(changed)
+
+
+def replace_image(route_image, upload) -> RouteImage:
+    """Swap one image's file (an upload or stored name), keeping its row (id, order, alt text)."""
+    old_name = route_image.image.name
+    old_variants = route_image.variants
+    storage = route_image.image.storage
+
+    route_image.image = upload
+    route_image.save(update_fields=["image"])
+    if route_image.image.name == old_name:
+        return route_image  # same bytes re-uploaded: nothing to redo
+
+    def collect():
+        if RouteImage.objects.filter(image=old_name).exists():
+            return  # still (or again) in use, e.g. the upload normalized back to it
+        images.delete_variants(route_image, old_variants)
+        images.release_original(old_name, storage)
+
+    transaction.on_commit(collect)
+    return route_image
+
+
+@transaction.atomic
+def apply_image_edits(route, *, remove=(), replace=None, orders=None, add=()) -> None:
+    """Run a batch of edits in one transaction: remove, replace, reorder, add."""
+    remove = set(remove)
+    remove_images(route, remove)
+
+    if replace:
+        by_id = {img.pk: img for img in route.images.filter(pk__in=replace.keys())}
+        for pk, upload in replace.items():
+            if pk in by_id and pk not in remove:
+                replace_image(by_id[pk], upload)
+
+    if orders or remove:
+        reorder_images(route, orders or {})
+
+    if add:
+        add_images(route, add)
+
+    # Reorders skip post_save, so mark the route changed explicitly
+    Route.touch(route.pk)
@@ -0,0 +1,78 @@
+"""
+Small geometry helpers for route search.
+
+Routes are bucketed into a fixed lat/lng grid (``Route.geocell``) so a radius
+search can prefilter candidates in SQL before running exact haversine math.
+"""
+import math
+
+EARTH_RADIUS_MILES = 3958.7613
+MILES_PER_DEGREE_LAT = 69.0
+
+# Grid cell size in degrees (~17 miles of latitude per cell)
+GRID_CELL_DEG = 0.25
+GRID_COLS = int(360 / GRID_CELL_DEG)
+
+# Past this many cells the IN (...) list stops paying off; fall back to the bbox
+MAX_QUERY_CELLS = 400
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points, in miles."""
+    phi1 = math.radians(lat1); phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1); dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
+    return 2 * EARTH_RADIUS_MILES * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def _row_col(lat: float, lng: float) -> tuple[int, int]:
+    row = int(math.floor((min(max(lat, -90.0), 90.0) + 90.0) / GRID_CELL_DEG))
+    col = int(math.floor(((lng + 180.0) % 360.0) / GRID_CELL_DEG))
+    return row, col % GRID_COLS
+
+
+def grid_cell(lat, lng) -> int | None:
+    """Return the integer grid cell for a coordinate pair (None if incomplete)."""
+    if lat is None or lng is None:
+        return None
+    row, col = _row_col(float(lat), float(lng))
+    return row * GRID_COLS + col
+
+
+def bounding_box(lat: float, lng: float, radius_miles: float):
+    """
+    Return (min_lat, max_lat, min_lng, max_lng) enclosing a circle of the given
+    radius. Longitude bounds are None when the box wraps the antimeridian or
+    reaches a pole, meaning "don't filter on longitude".
+    """
+    dlat = radius_miles / MILES_PER_DEGREE_LAT
+    min_lat = max(-90.0, lat - dlat)
+    max_lat = min(90.0, lat + dlat)
+
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if min_lat <= -90.0 or max_lat >= 90.0 or cos_lat <= 1e-6:
+        return min_lat, max_lat, None, None
+
+    dlng = radius_miles / (MILES_PER_DEGREE_LAT * cos_lat)
+    min_lng, max_lng = lng - dlng, lng + dlng
+    if min_lng < -180.0 or max_lng >= 180.0:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, min_lng, max_lng
+
+
+def cells_for_bbox(min_lat, max_lat, min_lng, max_lng) -> list[int] | None:
+    """
+    Return every grid cell touching the box, or None if the box is unbounded in
+    longitude or would need more than MAX_QUERY_CELLS cells.
+    """
+    if min_lng is None or max_lng is None:
+        return None
+    row_lo, col_lo = _row_col(min_lat, min_lng)
+    row_hi, col_hi = _row_col(max_lat, max_lng)
+    if (row_hi - row_lo + 1) * (col_hi - col_lo + 1) > MAX_QUERY_CELLS:
+        return None
+    return [
+        row * GRID_COLS + col
+        for row in range(row_lo, row_hi + 1)
+        for col in range(col_lo, col_hi + 1)
+    ]
@@ -0,0 +1,319 @@
+"""
+Server-side geocoding (Nominatim, first result) with a database-backed cache.
+
+The cache lives in the ``GeocodeCacheEntry`` table so every worker process
+shares it and it survives restarts. Failed lookups are stored too (with a
+shorter TTL) so we don't keep asking Nominatim about places it can't find.
+
+Network calls are spaced to at most REQUESTS_PER_SECOND per process
+(Nominatim's usage policy allows 1 req/s in total, so keep it at 1 with a
+single worker process, lower with more). Concurrent lookups from
+geocode_many share in-flight requests by key, and new ones are dropped
+while MAX_PENDING are already queued.
+"""
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection
+from django.utils import timezone
+
+import requests
+
+from .models import GeocodeCacheEntry
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+USER_AGENT = "ClimbApp/1.0 (contact@climbapp.local)"
+REQUEST_TIMEOUT = 6  # seconds
+
+# Defaults; override in settings.py
+POSITIVE_TTL = timedelta(days=getattr(settings, "GEOCODE_CACHE_TTL_DAYS", 90))
+NEGATIVE_TTL = timedelta(hours=getattr(settings, "GEOCODE_NEGATIVE_TTL_HOURS", 24))
+MAX_ENTRIES = getattr(settings, "GEOCODE_CACHE_MAX_ENTRIES", 10000)
+MAX_WORKERS = getattr(settings, "GEOCODE_MAX_WORKERS", 4)
+MAX_PENDING = getattr(settings, "GEOCODE_MAX_PENDING", 50)
+REQUESTS_PER_SECOND = getattr(settings, "GEOCODE_REQUESTS_PER_SECOND", 1.0)
+
+_stats_lock = threading.Lock()
+_stats = {
+    "hits": 0, "negative_hits": 0, "misses": 0, "lookups": 0, "errors": 0, "timeouts": 0,
+    "shared": 0, "dropped": 0,
+}
+
+# Shared pool for concurrent lookups (created on first use); bounds total
+# in-flight requests per process no matter how many searches run at once.
+_executor = None
+_executor_lock = threading.Lock()
+# normalized key -> Future of the queued or running lookup for it
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+# monotonic time before which the next network call may not start
+_next_request_at = 0.0
+_rate_lock = threading.Lock()
+
+
+def _bump(counter: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[counter] += n
+
+
+def normalize_location(text: str) -> str:
+    """Cache key for a location string: NFKC, casefolded, collapsed whitespace/commas."""
+    value = unicodedata.normalize("NFKC", str(text or ""))
+    value = value.casefold().strip()
+    value = re.sub(r"\s*,\s*", ", ", value)
+    value = re.sub(r"\s+", " ", value)
+    return value.strip(" ,")[:255]
+
+
+def cache_get(key: str):
+    """
+    Look up a normalized key. Returns (found, coords) where coords is
+    (lat, lon) or None for a cached negative result.
+    """
+    entry = (
+        GeocodeCacheEntry.objects
+        .filter(key=key, expires_at__gt=timezone.now())
+        .only("latitude", "longitude")
+        .first()
+    )
+    if entry is None:
+        _bump("misses")
+        return False, None
+    if entry.latitude is None or entry.longitude is None:
+        _bump("negative_hits")
+        return True, None
+    _bump("hits")
+    return True, (entry.latitude, entry.longitude)
+
+
+def cache_get_many(keys) -> dict:
+    """
+    Batch version of cache_get: one query for many normalized keys. Returns
+    {key: (lat, lon) or None} for the keys that are cached; misses are absent.
+    """
+    keys = list(keys)
+    if not keys:
+        return {}
+    rows = (
+        GeocodeCacheEntry.objects
+        .filter(key__in=keys, expires_at__gt=timezone.now())
+        .values_list("key", "latitude", "longitude")
+    )
+    found = {}
+    for key, lat, lon in rows:
+        found[key] = (lat, lon) if lat is not None and lon is not None else None
+    positives = sum(1 for v in found.values() if v)
+    _bump("hits", positives)
+    _bump("negative_hits", len(found) - positives)
+    _bump("misses", len(keys) - len(found))
+    return found
+
+
+def cache_set(key: str, coords) -> None:
+    """Store a positive (lat, lon) or negative (None) result and enforce MAX_ENTRIES."""
+    ttl = POSITIVE_TTL if coords else NEGATIVE_TTL
+    lat, lon = coords if coords else (None, None)
+    try:
+        GeocodeCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={
+                "latitude": lat,
+                "longitude": lon,
+                "expires_at": timezone.now() + ttl,
+            },
+        )
+    except IntegrityError:
+        # Another worker stored the same key first; theirs is just as good
+        return
+    evict()
+
+
+def evict(max_entries: int | None = None) -> int:
+    """
+    Drop expired entries, then the ones closest to expiry until the table fits
+    in max_entries. Returns the number of rows deleted.
+    """
+    max_entries = MAX_ENTRIES if max_entries is None else max_entries
+    deleted, _ = GeocodeCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+
+    overflow = GeocodeCacheEntry.objects.count() - max_entries
+    if overflow > 0:
+        stale_ids = list(
+            GeocodeCacheEntry.objects
+            .order_by("expires_at", "id")
+            .values_list("id", flat=True)[:overflow]
+        )
+        more, _ = GeocodeCacheEntry.objects.filter(id__in=stale_ids).delete()
+        deleted += more
+    return deleted
+
+
+def stats() -> dict:
+    """Hit/miss counters for this process plus the shared table's size."""
+    with _stats_lock:
+        data = dict(_stats)
+    served = data["hits"] + data["negative_hits"]
+    total = served + data["misses"]
+    data["hit_ratio"] = (served / total) if total else 0.0
+
+    now = timezone.now()
+    live = GeocodeCacheEntry.objects.filter(expires_at__gt=now)
+    data["entries"] = live.count()
+    data["negative_entries"] = live.filter(latitude__isnull=True).count()
+    data["expired_entries"] = GeocodeCacheEntry.objects.filter(expires_at__lte=now).count()
+    return data
+
+
+def _wait_for_slot() -> None:
+    """Block until this process may make its next Nominatim request."""
+    global _next_request_at
+    if REQUESTS_PER_SECOND <= 0:
+        return
+    with _rate_lock:
+        now = time.monotonic()
+        start = max(now, _next_request_at)
+        _next_request_at = start + 1.0 / REQUESTS_PER_SECOND
+    if start > now:
+        time.sleep(start - now)
+
+
+def _fetch_nominatim(location_text: str):
+    """One network lookup. Returns (lat, lon), None for no match; raises on transport errors."""
+    _wait_for_slot()
+    params = {"q": location_text, "format": "jsonv2", "limit": 1}
+    headers = {"User-Agent": USER_AGENT}
+    resp = requests.get(NOMINATIM_URL, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+    resp.raise_for_status()
+    data = resp.json()
+    if isinstance(data, list) and data:
+        return float(data[0]["lat"]), float(data[0]["lon"])
+    return None
+
+
+def geocode_first(location_text: str):
+    """
+    Return (lat, lon) using the first result from Nominatim for the given text,
+    or None. Results (including misses) are cached in the shared DB table.
+    """
+    if not location_text:
+        return None
+    key = normalize_location(location_text)
+    if not key:
+        return None
+
+    found, coords = cache_get(key)
+    if found:
+        return coords
+    return _lookup(key, location_text)
+
+
+def _lookup(key: str, location_text: str):
+    """Network lookup for a cache miss; stores the result (positive or negative)."""
+    _bump("lookups")
+    try:
+        coords = _fetch_nominatim(location_text)
+    except Exception:
+        # Transport/HTTP errors aren't "no such place"; don't cache them
+        _bump("errors")
+        return None
+
+    cache_set(key, coords)
+    return coords
+
+
+def _threaded_lookup(key: str, location_text: str):
+    try:
+        # Queued lookups may have waited a while; another worker may have stored it meanwhile
+        found, coords = cache_get(key)
+        if found:
+            return coords
+        return _lookup(key, location_text)
+    finally:
+        # Pool threads get their own DB connection; don't leave it open
+        connection.close()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="geocode")
+        return _executor
+
+
+def _submit(key: str, location_text: str):
+    """The Future for `key`'s lookup: already in flight, newly queued, or None if the backlog is full."""
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        if future is not None:
+            _bump("shared")
+            return future
+        if len(_in_flight) >= MAX_PENDING:
+            _bump("dropped")
+            return None
+        future = _get_executor().submit(_threaded_lookup, key, location_text)
+        _in_flight[key] = future
+
+    def forget(done):
+        with _in_flight_lock:
+            if _in_flight.get(key) is done:
+                del _in_flight[key]
+
+    future.add_done_callback(forget)
+    return future
+
+
+def geocode_many(location_texts, *, allow_network: bool = False, budget: float | None = None) -> dict:
+    """
+    Resolve many location strings at once. Identical strings (after
+    normalize_location) are looked up once; cached entries come from a single
+    query. With allow_network, cache misses are looked up concurrently in a
+    shared thread pool (joining lookups other requests already started, and
+    skipping new ones while MAX_PENDING are queued), and we stop waiting
+    after `budget` seconds.
+
+    Returns {normalized key: (lat, lon) or None}. Keys that couldn't be
+    resolved in time are absent; their lookups finish in the background and
+    land in the cache for the next request.
+    """
+    texts = {}
+    for text in location_texts:
+        key = normalize_location(text) if text else ""
+        if key:
+            texts.setdefault(key, text)
+
+    results = cache_get_many(texts)
+    missing = [key for key in texts if key not in results]
+    if not allow_network or not missing:
+        return results
+
+    futures = {}
+    for key in missing:
+        future = _submit(key, texts[key])
+        if future is not None:
+            futures[future] = key
+    done, pending = wait(futures, timeout=budget)
+    for fut in done:
+        results[futures[fut]] = fut.result()
+    _bump("timeouts", len(pending))
+    return results
+
+
+def geocode_route(route) -> bool:
+    """
+    Fill route.latitude/longitude from route.location_name. Marks the route as
+    coords_geocoded on success. Doesn't save. Returns True if coordinates were set.
+    """
+    coords = geocode_first(route.location_name)
+    if not coords:
+        route.latitude = route.longitude = None
+        route.coords_geocoded = False
+        return False
+    route.latitude, route.longitude = coords
+    route.coords_geocoded = True
+    return True
@@ -0,0 +1,209 @@
+"""
+Post-upload image work for RouteImage: clean up the original (apply EXIF
+orientation, strip metadata, cap its size, re-encode) and write resized WebP
+derivatives (thumb / medium / full).
+
+This runs off the request path via routes.jobs. Templates use
+RouteImage.thumb_url / full_url / srcset, which fall back to the original
+upload until variants exist (e.g. right after loaddata; run
+`manage.py generate_image_variants` to backfill).
+
+Originals live in content-addressed storage (routes.storage), so several
+RouteImage rows may share one file. Variants are named after their source
+file and shared the same way; files are only deleted once no row refers to
+them (release_original / delete_variants). release_original leaves originals
+written or re-used within ORPHAN_GRACE_SECONDS alone, since an identical
+upload may be about to refer to them; `manage.py gc_route_images` collects
+those later.
+"""
+import logging
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .storage import is_cas_name
+
+logger = logging.getLogger(__name__)
+
+# Max width per variant, in px; originals are never upscaled
+VARIANT_WIDTHS = {"thumb": 320, "medium": 800, "full": 1600}
+WEBP_QUALITY = 80
+VARIANT_DIR = "routes/variants/"
+
+# Stored originals are capped to this many px on the longest side
+ORIGINAL_MAX_SIDE = 3200
+JPEG_QUALITY = 88
+_REENCODE_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG", ".webp": "WEBP"}
+
+# Unreferenced files younger than this (by mtime) are left for a later GC run
+ORPHAN_GRACE_SECONDS = getattr(settings, "ROUTE_IMAGE_ORPHAN_GRACE_SECONDS", 60 * 60)
+
+
+def _load(route_image) -> Image.Image:
+    with route_image.image.open("rb") as fh:
+        img = Image.open(fh)
+        img = ImageOps.exif_transpose(img)  # bake in camera rotation
+        img.load()
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    return img
+
+
+def normalize_original(route_image) -> bool:
+    """
+    Replace the stored upload with a cleaned copy: orientation applied, EXIF
+    (incl. GPS) dropped, longest side capped at ORIGINAL_MAX_SIDE. GIFs are
+    left alone. The copy is saved as a new content-addressed file and the old
+    one released. Returns True if the image was rewritten (False also when the
+    row was deleted or given another file while this ran).
+    """
+    name = route_image.image.name
+    fmt = _REENCODE_FORMATS.get(PurePosixPath(name).suffix.lower())
+    if fmt is None:
+        return False
+    img = _load(route_image)
+    img.thumbnail((ORIGINAL_MAX_SIDE, ORIGINAL_MAX_SIDE), Image.LANCZOS)
+
+    buf = BytesIO()
+    if fmt == "JPEG":
+        img.convert("RGB").save(buf, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    elif fmt == "WEBP":
+        img.save(buf, "WEBP", quality=JPEG_QUALITY)
+    else:
+        img.save(buf, "PNG", optimize=True)
+
+    # Pillow doesn't carry EXIF over unless asked, so the rewrite drops it
+    new_name = route_image.image.storage.save(name, ContentFile(buf.getvalue()))
+    if new_name != name:
+        storage = route_image.image.storage
+        # Only if the row still holds the file we started from (not deleted or replaced meanwhile)
+        if not type(route_image).objects.filter(pk=route_image.pk, image=name).update(image=new_name):
+            release_original(new_name, storage)
+            return False
+        route_image.image = new_name  # fresh FieldFile; the old handle points at the released file
+        release_original(name, storage)
+    return True
+
+
+def release_original(name: str, storage=None) -> bool:
+    """
+    Delete a content-addressed original once no RouteImage refers to it.
+    Legacy (pre-CAS) uploads and recently written files are never touched.
+    Returns True if deleted.
+    """
+    from .models import RouteImage
+
+    storage = storage or default_storage
+    if (
+        not is_cas_name(name)
+        or recently_written(name, storage)
+        or RouteImage.objects.filter(image=name).exists()
+    ):
+        return False
+    storage.delete(name)
+    return True
+
+
+def recently_written(name: str, storage) -> bool:
+    """True if the file was written (or re-used by an upload) within ORPHAN_GRACE_SECONDS."""
+    try:
+        modified = storage.get_modified_time(name)
+    except FileNotFoundError:
+        return False
+    return (timezone.now() - modified).total_seconds() < ORPHAN_GRACE_SECONDS
+
+
+def _copy_shared_variants(route_image) -> bool:
+    """Reuse the variants of another row that already processed the same file."""
+    twin = (
+        type(route_image).objects
+        .filter(image=route_image.image.name)
+        .exclude(pk=route_image.pk)
+        .exclude(variants={})
+        .values_list("variants", flat=True)
+        .first()
+    )
+    if not twin or twin.get("source") != route_image.image.name:
+        return False
+    type(route_image).objects.filter(pk=route_image.pk).update(variants=twin)
+    route_image.variants = twin
+    return True
+
+
+def process_upload(route_image) -> None:
+    """Everything that happens to a new upload after the request returns."""
+    if is_cas_name(route_image.image.name) and _copy_shared_variants(route_image):
+        return  # identical bytes were already cleaned up and resized
+    normalize_original(route_image)
+    if _copy_shared_variants(route_image):
+        return
+    if not generate_variants(route_image):
+        raise ValueError(f"Could not build variants for {route_image.image.name}")
+
+
+def generate_variants(route_image) -> dict:
+    """
+    Write WebP variants for a RouteImage and store their metadata on it.
+    Returns the new `variants` dict ({} if the source can't be decoded).
+
+    Variant files are named after the source file, so for content-addressed
+    sources an existing file already holds the right bytes and is reused.
+    """
+    try:
+        img = _load(route_image)
+    except Exception:
+        logger.exception("Could not decode %s for variants", route_image.image.name)
+        return {}
+
+    previous = route_image.variants
+    source = route_image.image.name
+    shared = is_cas_name(source)
+    stem = PurePosixPath(source).stem if shared else f"{PurePosixPath(source).stem}_{route_image.pk}"
+    sizes = {}
+    seen = {}  # (w, h) -> entry, so small originals don't get three identical files
+    for name, max_width in VARIANT_WIDTHS.items():
+        resized = img.copy()
+        if resized.width > max_width:
+            resized.thumbnail((max_width, resized.height), Image.LANCZOS)
+        dims = (resized.width, resized.height)
+        if dims in seen:
+            sizes[name] = seen[dims]
+            continue
+
+        path = f"{VARIANT_DIR}{stem}_{name}.webp"
+        if not (shared and default_storage.exists(path)):
+            buf = BytesIO()
+            resized.save(buf, "WEBP", quality=WEBP_QUALITY, method=4)
+            default_storage.delete(path)
+            path = default_storage.save(path, ContentFile(buf.getvalue()))
+        sizes[name] = seen[dims] = {"name": path, "width": dims[0], "height": dims[1]}
+
+    variants = {"source": source, "sizes": sizes}
+    # .update() so this doesn't re-enter the post_save hook
+    type(route_image).objects.filter(pk=route_image.pk).update(variants=variants)
+    route_image.variants = variants
+
+    kept = {entry["name"] for entry in sizes.values()}
+    delete_variants(route_image, previous, keep=kept)
+    return variants
+
+
+def delete_variants(route_image, variants=None, keep=()) -> None:
+    """
+    Remove variant files (by default the row's current ones) from storage,
+    unless another RouteImage still uses them or they are listed in `keep`.
+    """
+    variants = route_image.variants if variants is None else variants
+    names = {v["name"] for v in (variants or {}).get("sizes", {}).values()} - set(keep)
+    source = (variants or {}).get("source")
+    if not names:
+        return
+    if source and type(route_image).objects.filter(image=source).exclude(pk=route_image.pk).exists():
+        return  # shared with another row using the same original
+    for name in names:
+        default_storage.delete(name)
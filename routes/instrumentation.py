@@ -0,0 +1,182 @@
+"""
+Per-view query counts and timings.
+
+PerformanceMiddleware (first in MIDDLEWARE) measures every request: total
+latency, the number of SQL queries and time spent in them (on every
+database alias), and template rendering time (through TimedDjangoTemplates,
+the template backend in settings). Results are aggregated per URL name in
+this process, shown on the admin-only page at admin/performance/, and
+sent back as a Server-Timing header (SERVER_TIMING: "all", "staff" or
+"off") so browser dev tools show the breakdown.
+
+VIEW_QUERY_BUDGETS caps queries per URL name, e.g. {"routes:list": 6}.
+Requests over budget are logged and counted; with VIEW_QUERY_BUDGETS_STRICT
+(meant for tests) they raise QueryBudgetExceeded instead.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMING = getattr(settings, "SERVER_TIMING", "staff")
+BUDGETS = getattr(settings, "VIEW_QUERY_BUDGETS", {})
+STRICT = getattr(settings, "VIEW_QUERY_BUDGETS_STRICT", False)
+# Latencies kept per view for the percentiles on the stats page
+SAMPLE_SIZE = 500
+
+# Per request: {"queries", "db", "template"} (seconds); None outside the middleware
+_current = ContextVar("instrumentation_current", default=None)
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+# ---- collection ----
+def _query_timer(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics["db"] += time.perf_counter() - started
+        metrics["queries"] += 1
+
+
+class _TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics["template"] += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates whose top-level renders count towards the request's template time."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return _TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def _view_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else "<unresolved>"
+
+
+def _record(view_name, total, metrics, over_budget) -> None:
+    with _stats_lock:
+        entry = _stats.setdefault(view_name, {
+            "requests": 0, "total": 0.0, "db": 0.0, "template": 0.0,
+            "queries": 0, "max_queries": 0, "over_budget": 0,
+            "latencies": deque(maxlen=SAMPLE_SIZE),
+        })
+        entry["requests"] += 1
+        entry["total"] += total
+        entry["db"] += metrics["db"]
+        entry["template"] += metrics["template"]
+        entry["queries"] += metrics["queries"]
+        entry["max_queries"] = max(entry["max_queries"], metrics["queries"])
+        entry["over_budget"] += over_budget
+        entry["latencies"].append(total)
+
+
+def _server_timing(total, metrics) -> str:
+    return ", ".join([
+        f'db;dur={metrics["db"] * 1000:.1f};desc="{metrics["queries"]} queries"',
+        f'tpl;dur={metrics["template"] * 1000:.1f}',
+        f"total;dur={total * 1000:.1f}",
+    ])
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = {"queries": 0, "db": 0.0, "template": 0.0}
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_query_timer))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+
+        view_name = _view_name(request)
+        budget = BUDGETS.get(view_name)
+        over_budget = budget is not None and metrics["queries"] > budget
+        _record(view_name, total, metrics, over_budget)
+
+        user = getattr(request, "user", None)
+        if SERVER_TIMING == "all" or (SERVER_TIMING == "staff" and getattr(user, "is_staff", False)):
+            response["Server-Timing"] = _server_timing(total, metrics)
+
+        if over_budget:
+            message = f"{view_name} ran {metrics['queries']} queries (budget {budget}) for {request.path}"
+            if STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+# ---- reporting ----
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def stats() -> list[dict]:
+    """Per-view aggregates for this process, slowest (by total time) first; times in ms."""
+    with _stats_lock:
+        entries = {name: {**entry, "latencies": sorted(entry["latencies"])} for name, entry in _stats.items()}
+    rows = []
+    for name, e in entries.items():
+        n = e["requests"]
+        rows.append({
+            "view": name,
+            "requests": n,
+            "avg_ms": e["total"] / n * 1000,
+            "p50_ms": _percentile(e["latencies"], 0.5) * 1000,
+            "p95_ms": _percentile(e["latencies"], 0.95) * 1000,
+            "avg_db_ms": e["db"] / n * 1000,
+            "avg_template_ms": e["template"] / n * 1000,
+            "avg_queries": e["queries"] / n,
+            "max_queries": e["max_queries"],
+            "budget": BUDGETS.get(name),
+            "over_budget": e["over_budget"],
+            "total_ms": e["total"] * 1000,
+        })
+    rows.sort(key=lambda row: row["total_ms"], reverse=True)
+    return rows
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
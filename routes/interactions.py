@@ -0,0 +1,199 @@
+"""
+Batched votes and favorites, for clients that queue interactions (offline
+replay, rapid clicking) and send them in one request.
+
+Operations set a state rather than toggle, so replaying one is harmless:
+    {"route": 12, "action": "upvote", "at": "2026-10-17T09:30:00Z"}
+with action one of ACTIONS. They are applied last-write-wins on the client
+timestamp `at`: within a batch the latest operation per route and kind
+(vote or favorite) is the one applied, and it is skipped as "stale" if the
+stored vote/favorite was written later than that. Removals leave no row
+behind, so a stale operation replayed after an online removal is applied
+(there is no tombstone to compare against).
+
+The raw single-statement helpers at the bottom are shared with the
+Vote.toggle / Favorite.toggle endpoints.
+"""
+from datetime import timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import page_cache
+
+MAX_OPERATIONS = 200
+# Vote direction to set (None removes the vote) / favorite state to set
+VOTE_ACTIONS = {"upvote": True, "downvote": False, "unvote": None}
+FAVORITE_ACTIONS = {"favorite": True, "unfavorite": False}
+ACTIONS = {**VOTE_ACTIONS, **FAVORITE_ACTIONS}
+
+
+class OperationError(ValueError):
+    pass
+
+
+def parse_operation(raw) -> dict:
+    """Validate one client operation; raises OperationError with a message for the client."""
+    if not isinstance(raw, dict):
+        raise OperationError("Each operation must be an object.")
+    route = raw.get("route")
+    if isinstance(route, bool) or not isinstance(route, int) or route <= 0:
+        raise OperationError("route must be a route id.")
+    action = raw.get("action")
+    if action not in ACTIONS:
+        raise OperationError(f"action must be one of: {', '.join(ACTIONS)}.")
+    try:
+        at = parse_datetime(raw["at"]) if isinstance(raw.get("at"), str) else None
+    except ValueError:  # well formed but impossible, e.g. February 30th
+        at = None
+    if at is None:
+        raise OperationError("at must be an ISO 8601 timestamp.")
+    if timezone.is_naive(at):
+        at = at.replace(tzinfo=dt_timezone.utc)
+    # A fast device clock must not make its writes unbeatable
+    return {"route": route, "action": action, "at": min(at, timezone.now())}
+
+
+def apply_operations(user, raw_operations) -> tuple[list, dict]:
+    """
+    Apply a batch in one transaction. Returns (results, routes): one result
+    per input operation, in order, with a status of "applied", "unchanged",
+    "superseded" (a later operation in the batch won), "stale" or "error";
+    and the current counters and the user's state for every route mentioned.
+    """
+    from .models import Favorite, Route, Vote
+
+    results, latest = [], {}
+    for index, raw in enumerate(raw_operations):
+        try:
+            op = parse_operation(raw)
+        except OperationError as e:
+            results.append({"index": index, "status": "error", "error": str(e)})
+            continue
+        results.append({"index": index, "route": op["route"], "action": op["action"], "status": "superseded"})
+        kind = "vote" if op["action"] in VOTE_ACTIONS else "favorite"
+        key = (op["route"], kind)
+        # Ties go to the later operation in the batch
+        if key not in latest or op["at"] >= latest[key][1]["at"]:
+            latest[key] = (index, op)
+
+    route_ids = sorted({route_id for route_id, _ in latest})
+    with transaction.atomic():
+        existing_routes = set(Route.objects.filter(pk__in=route_ids).values_list("pk", flat=True))
+        votes, vote_times = {}, {}
+        for route_id, is_upvote, updated_at in (
+            Vote.objects.filter(user=user, route_id__in=existing_routes)
+            .order_by().values_list("route_id", "is_upvote", "updated_at")
+        ):
+            votes[route_id], vote_times[route_id] = is_upvote, updated_at
+        favorite_times = dict(
+            Favorite.objects.filter(user=user, route_id__in=existing_routes)
+            .order_by().values_list("route_id", "created_at")
+        )
+
+        deltas = {pk: {"upvotes": 0, "downvotes": 0, "favorites_count": 0} for pk in existing_routes}
+        for (route_id, kind), (index, op) in latest.items():
+            result = results[index]
+            if route_id not in existing_routes:
+                result.update(status="error", error="No such route.")
+                continue
+            if kind == "vote":
+                result["status"] = _apply_vote(user, route_id, op, votes, vote_times, deltas[route_id])
+            else:
+                result["status"] = _apply_favorite(user, route_id, op, favorite_times, deltas[route_id])
+
+        counters = {}
+        for pk in existing_routes:
+            counters[pk] = Route.adjust_counters(pk, **deltas[pk])
+            if any(deltas[pk].values()):
+                page_cache.invalidate_route(pk)  # raw writes skip the Vote/Favorite receivers
+
+    routes = {
+        pk: {
+            **counters[pk],
+            "net_votes": counters[pk]["upvotes"] - counters[pk]["downvotes"],
+            "user_vote": votes.get(pk),
+            "is_favorited": pk in favorite_times,
+        }
+        for pk in existing_routes
+    }
+    return results, routes
+
+
+def _apply_vote(user, route_id, op, votes, vote_times, delta) -> str:
+    from .models import Vote
+
+    wanted, current = VOTE_ACTIONS[op["action"]], votes.get(route_id)
+    if route_id in vote_times and vote_times[route_id] > op["at"]:
+        return "stale"
+    if wanted == current:
+        return "unchanged"
+
+    if current is None:
+        insert_ignoring_conflict(
+            Vote, user_id=user.pk, route_id=route_id, is_upvote=wanted, created_at=op["at"], updated_at=op["at"],
+        )
+    elif wanted is None:
+        delete_rows(Vote, user_id=user.pk, route_id=route_id)
+    else:
+        # QuerySet.update() leaves auto_now alone, so the client's time is kept
+        Vote.objects.filter(user=user, route_id=route_id).update(is_upvote=wanted, updated_at=op["at"])
+
+    if current is not None:
+        delta["upvotes" if current else "downvotes"] -= 1
+    if wanted is not None:
+        delta["upvotes" if wanted else "downvotes"] += 1
+    if wanted is None:
+        del votes[route_id], vote_times[route_id]
+    else:
+        votes[route_id], vote_times[route_id] = wanted, op["at"]
+    return "applied"
+
+
+def _apply_favorite(user, route_id, op, favorite_times, delta) -> str:
+    from .models import Favorite
+
+    wanted, current = FAVORITE_ACTIONS[op["action"]], route_id in favorite_times
+    if current and favorite_times[route_id] > op["at"]:
+        return "stale"
+    if wanted == current:
+        return "unchanged"
+
+    if wanted:
+        insert_ignoring_conflict(Favorite, user_id=user.pk, route_id=route_id, created_at=op["at"])
+        favorite_times[route_id] = op["at"]
+        delta["favorites_count"] += 1
+    else:
+        delete_rows(Favorite, user_id=user.pk, route_id=route_id)
+        favorite_times.pop(route_id)
+        delta["favorites_count"] -= 1
+    return "applied"
+
+
+# ---- single-statement writes ----
+def insert_ignoring_conflict(model, **values) -> bool:
+    """INSERT one row unless it would violate a unique constraint. True if inserted."""
+    qn = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in values]
+    params = [f.get_db_prep_save(value, connection) for f, value in zip(fields, values.values())]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {qn(model._meta.db_table)} ({', '.join(qn(f.column) for f in fields)}) "
+            f"VALUES ({', '.join(['%s'] * len(fields))}) ON CONFLICT DO NOTHING",
+            params,
+        )
+        return cursor.rowcount == 1
+
+
+def delete_rows(model, **filters) -> int:
+    """Single-statement DELETE, without the collector's SELECT or delete signals."""
+    qn = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in filters]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {qn(model._meta.db_table)} WHERE "
+            + " AND ".join(f"{qn(f.column)} = %s" for f in fields),
+            [f.get_db_prep_value(value, connection) for f, value in zip(fields, filters.values())],
+        )
+        return cursor.rowcount
@@ -0,0 +1,109 @@
+"""
+A small DB-backed job queue for post-upload image work.
+
+Saving a RouteImage inserts an ImageJob row (cheap) instead of resizing and
+re-encoding inside the request. `manage.py process_image_jobs` drains the
+queue; any number of those workers can run side by side because a job is
+claimed with a conditional UPDATE. Set IMAGE_JOBS_MODE = "sync" to process
+inline instead (handy for local dev without a worker).
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from . import images, page_cache
+
+logger = logging.getLogger(__name__)
+
+MODE = getattr(settings, "IMAGE_JOBS_MODE", "queue")
+MAX_ATTEMPTS = getattr(settings, "IMAGE_JOBS_MAX_ATTEMPTS", 3)
+# A job still "running" after this long belonged to a worker that died
+STALE_AFTER = timedelta(minutes=10)
+
+
+def enqueue_image(route_image):
+    """Queue processing for a freshly saved RouteImage."""
+    from .models import ImageJob
+
+    job = ImageJob.objects.create(route_id=route_image.route_id, route_image=route_image)
+    if MODE == "sync" and _claim(job.pk):
+        job.refresh_from_db()
+        run_job(job)
+    return job
+
+
+def _claim(job_id) -> bool:
+    from .models import ImageJob
+
+    return bool(
+        ImageJob.objects
+        .filter(pk=job_id, status=ImageJob.PENDING)
+        .update(status=ImageJob.RUNNING, attempts=F("attempts") + 1, started_at=timezone.now())
+    )
+
+
+def requeue_stale() -> int:
+    """Put jobs abandoned by a crashed worker back in the queue."""
+    from .models import ImageJob
+
+    return (
+        ImageJob.objects
+        .filter(status=ImageJob.RUNNING, started_at__lt=timezone.now() - STALE_AFTER)
+        .update(status=ImageJob.PENDING)
+    )
+
+
+def claim_next():
+    """Atomically take the oldest pending job, or return None if the queue is empty."""
+    from .models import ImageJob
+
+    while True:
+        job_id = (
+            ImageJob.objects.filter(status=ImageJob.PENDING)
+            .order_by("id").values_list("id", flat=True).first()
+        )
+        if job_id is None:
+            return None
+        if _claim(job_id):
+            return ImageJob.objects.select_related("route_image").get(pk=job_id)
+        # Another worker got it first; try the next one
+
+
+def run_job(job) -> None:
+    """Process one claimed job and record the outcome."""
+    from .models import ImageJob, Route
+
+    try:
+        images.process_upload(job.route_image)
+    except Exception as e:
+        logger.exception("Image job %s failed", job.pk)
+        job.status = ImageJob.FAILED if job.attempts >= MAX_ATTEMPTS else ImageJob.PENDING
+        job.error = f"{type(e).__name__}: {e}"
+    else:
+        job.status = ImageJob.DONE
+        job.error = ""
+        # Variants are written with .update(); cached pages still point at the original
+        Route.touch(job.route_id)
+        page_cache.invalidate_route(job.route_id)
+    job.finished_at = timezone.now()
+    # Not job.save(): deleting the image mid-run cascades to the job row
+    if not ImageJob.objects.filter(pk=job.pk).update(
+        status=job.status, error=job.error, finished_at=job.finished_at
+    ):
+        logger.info("Image job %s finished after its image was deleted", job.pk)
+
+
+def run_pending(limit: int | None = None) -> int:
+    """Drain up to `limit` jobs (all if None). Returns how many were run."""
+    requeue_stale()
+    ran = 0
+    while limit is None or ran < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        ran += 1
+    return ran
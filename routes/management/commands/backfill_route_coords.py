@@ -0,0 +1,84 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from routes import clustering, page_cache
+from routes.embeds import map_embed_url
+from routes.geo import grid_cell
+from routes.geocoding import cache_get, geocode_first, normalize_location
+from routes.models import Route
+
+
+class Command(BaseCommand):
+    help = "Geocode text-only routes (location_name but no lat/lng) and store their coordinates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=None, help="Only process this many routes.")
+        parser.add_argument(
+            "--delay", type=float, default=1.1,
+            help="Seconds between network lookups (Nominatim allows ~1 request/sec).",
+        )
+        parser.add_argument("--batch-size", type=int, default=200, help="Rows per bulk update.")
+        parser.add_argument("--dry-run", action="store_true", help="Look up coordinates but don't save them.")
+
+    def handle(self, *args, **options):
+        qs = (
+            Route.objects
+            .filter(latitude__isnull=True)
+            .exclude(location_name="")
+            .only("id", "location_name", "latitude", "longitude")
+            .order_by("id")
+        )
+        if options["limit"]:
+            qs = qs[:options["limit"]]
+        routes = list(qs)
+
+        # One lookup per distinct location text; many routes share a crag name
+        by_key = {}
+        for r in routes:
+            by_key.setdefault(normalize_location(r.location_name), []).append(r)
+
+        delay = max(0.0, options["delay"])
+        last_network_at = 0.0
+        resolved = []
+        now = timezone.now()
+        for key, group in by_key.items():
+            if not key:
+                continue
+            found, coords = cache_get(key)
+            if not found:
+                # Only real network lookups are rate limited
+                wait = delay - (time.monotonic() - last_network_at)
+                if wait > 0:
+                    time.sleep(wait)
+                coords = geocode_first(group[0].location_name)
+                last_network_at = time.monotonic()
+
+            if not coords:
+                self.stdout.write(f"  no match: {group[0].location_name!r} ({len(group)} route(s))")
+                continue
+            for r in group:
+                r.latitude, r.longitude = coords
+                r.coords_geocoded = True
+                # bulk_update skips pre_save, so derive these here
+                r.geocell = grid_cell(*coords)
+                r.map_embed_url = map_embed_url(r.latitude, r.longitude, r.location_name)
+                r.updated_at = now  # auto_now isn't applied by bulk_update either
+                resolved.append(r)
+
+        if not options["dry_run"] and resolved:
+            Route.objects.bulk_update(
+                resolved,
+                ["latitude", "longitude", "coords_geocoded", "geocell", "map_embed_url", "updated_at"],
+                batch_size=options["batch_size"],
+            )
+            clustering.invalidate_all()  # bulk_update skips the post_save invalidation
+            # Listings and each changed detail page (ETags follow updated_at)
+            page_cache.invalidate(page_cache.CATALOG, *(page_cache.route_scope(r.pk) for r in resolved))
+
+        verb = "Would update" if options["dry_run"] else "Updated"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(resolved)} of {len(routes)} text-only route(s) "
+            f"({len(by_key)} distinct location(s))."
+        ))
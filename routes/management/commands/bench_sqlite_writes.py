@@ -0,0 +1,137 @@
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from routes import sqlite_tuning
+
+SCHEMA = """
+CREATE TABLE route (id INTEGER PRIMARY KEY, upvotes INTEGER NOT NULL DEFAULT 0, downvotes INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE vote (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, route_id INTEGER NOT NULL REFERENCES route (id),
+    is_upvote BOOLEAN NOT NULL, UNIQUE (user_id, route_id)
+);
+"""
+
+
+def _toggle(conn, begin, user_id, route_id, is_upvote):
+    """The statement sequence of Vote.toggle plus Route.adjust_counters."""
+    up, down = (1, 0) if is_upvote else (0, 1)
+    conn.execute(begin)
+    try:
+        cur = conn.execute(
+            "INSERT INTO vote (user_id, route_id, is_upvote) VALUES (?, ?, ?) ON CONFLICT DO NOTHING",
+            (user_id, route_id, is_upvote),
+        )
+        if not cur.rowcount:
+            cur = conn.execute(
+                "UPDATE vote SET is_upvote = ? WHERE user_id = ? AND route_id = ? AND is_upvote <> ?",
+                (is_upvote, user_id, route_id, is_upvote),
+            )
+            if cur.rowcount:
+                up, down = (1, -1) if is_upvote else (-1, 1)
+            else:
+                conn.execute("DELETE FROM vote WHERE user_id = ? AND route_id = ?", (user_id, route_id))
+                up, down = -up, -down
+        conn.execute(
+            "UPDATE route SET upvotes = MAX(upvotes + ?, 0), downvotes = MAX(downvotes + ?, 0) "
+            "WHERE id = ? RETURNING upvotes, downvotes",
+            (up, down, route_id),
+        ).fetchone()
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent vote writes on a scratch SQLite file: SQLite's defaults with a "
+        "connection per request vs. SQLITE_PRAGMAS, BEGIN IMMEDIATE and persistent connections."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8, help="Concurrent writers (like web workers).")
+        parser.add_argument("--ops", type=int, default=300, help="Votes per writer.")
+        parser.add_argument("--routes", type=int, default=5, help="Routes voted on (fewer = hotter rows).")
+        parser.add_argument("--timeout", type=float, default=5.0,
+                            help="Busy timeout in seconds for the untuned run (Python's sqlite3 default).")
+
+    def handle(self, *args, **options):
+        configs = [
+            ("defaults", {
+                "pragmas": {}, "begin": "BEGIN", "persistent": False, "timeout": options["timeout"],
+            }),
+            ("tuned", {
+                "pragmas": sqlite_tuning.pragmas(), "begin": "BEGIN IMMEDIATE", "persistent": True,
+                "timeout": sqlite_tuning.pragmas().get("busy_timeout", 5000) / 1000,
+            }),
+        ]
+        for label, config in configs:
+            with tempfile.TemporaryDirectory() as tmp:
+                result = self._run(Path(tmp) / "bench.sqlite3", config, options)
+            self.stdout.write(
+                f"{label:>8}: {result['ops_per_sec']:8.1f} votes/s  "
+                f"p50 {result['p50']:6.2f} ms  p95 {result['p95']:7.2f} ms  "
+                f"locked errors {result['errors']}/{result['total']}"
+            )
+
+    def _run(self, path, config, options):
+        def connect():
+            conn = sqlite3.connect(path, timeout=config["timeout"], isolation_level=None,
+                                   check_same_thread=False)
+            for statement in sqlite_tuning.pragma_statements(config["pragmas"]):
+                conn.execute(statement).fetchall()
+            return conn
+
+        setup = connect()
+        setup.executescript(SCHEMA)
+        setup.executemany("INSERT INTO route (id) VALUES (?)", [(i,) for i in range(1, options["routes"] + 1)])
+        setup.close()
+
+        latencies, errors, lock = [], [0], threading.Lock()
+
+        def worker(n):
+            rng = random.Random(n)
+            conn = connect() if config["persistent"] else None
+            mine = []
+            for i in range(options["ops"]):
+                started = time.perf_counter()
+                c = conn or connect()
+                try:
+                    # A handful of users per worker, so votes also switch and get taken back
+                    _toggle(c, config["begin"], n * 10 + rng.randrange(10),
+                            rng.randint(1, options["routes"]), rng.random() < 0.7)
+                    mine.append(time.perf_counter() - started)
+                except sqlite3.OperationalError:
+                    with lock:
+                        errors[0] += 1
+                finally:
+                    if conn is None:
+                        c.close()
+            with lock:
+                latencies.extend(mine)
+            if conn:
+                conn.close()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(options["threads"])]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        ms = sorted(x * 1000 for x in latencies) or [0.0]
+        return {
+            "ops_per_sec": len(latencies) / elapsed,
+            "p50": statistics.median(ms),
+            "p95": ms[int(len(ms) * 0.95) - 1] if len(ms) > 1 else ms[0],
+            "errors": errors[0],
+            "total": options["threads"] * options["ops"],
+        }
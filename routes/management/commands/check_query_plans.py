@@ -0,0 +1,80 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Value
+from django.db.models.functions import Lower
+
+from routes.models import Favorite, Route, RouteImage, Vote
+from routes.pagination import _after
+
+_FULL_SCAN_RE = re.compile(r"\bSCAN \w+\s*$", re.MULTILINE)
+
+
+def hot_queries(user):
+    """
+    (label, queryset, index the plan must use) for the queries the views run
+    most. Where the index must be seeked, not walked, the expected text
+    includes the "SEARCH" line.
+    """
+    by_title = Route.objects.annotate(title_ci=Lower("title"))
+    title_keys = [("title_ci", False), ("id", False)]
+    return [
+        ("route_list page", by_title.order_by("title_ci", "id")[:20], "route_title_ci_id_idx"),
+        ("route_list next page",
+         by_title.order_by("title_ci", "id").filter(_after(title_keys, ["m", 100], False))[:20],
+         "SEARCH routes_route USING INDEX route_title_ci_id_idx"),
+        ("route_list previous page",
+         by_title.order_by("-title_ci", "-id").filter(_after(title_keys, ["m", 100], True))[:20],
+         "SEARCH routes_route USING INDEX route_title_ci_id_idx"),
+        ("clean_title duplicate check",
+         Route.objects.alias(title_ci=Lower("title")).filter(author=user, title_ci=Lower(Value("x"))),
+         "route_author_title_ci_idx"),
+        ("route_search difficulty range", Route.objects.filter(difficulty__gte=4, difficulty__lte=5),
+         "route_difficulty_idx"),
+        ("route_map_data bbox",
+         Route.objects.filter(latitude__gte=40, latitude__lte=41, longitude__gte=-106, longitude__lte=-105),
+         "route_lat_lng_idx"),
+        ("my routes", Route.objects.filter(author=user).order_by("-id"), "routes_route_author_id"),
+        ("newest routes", Route.objects.order_by("-created_at")[:20], "route_created_at_idx"),
+        ("route images prefetch", RouteImage.objects.filter(route_id__in=[1, 2, 3]).order_by("order", "id"),
+         "routeimage_route_order_idx"),
+        ("user's votes on a page", Vote.objects.filter(user=user, route_id__in=[1, 2, 3]).order_by(),
+         "routes_vote_user_id_route_id"),
+        ("route vote tallies", Vote.objects.filter(route_id=1, is_upvote=True).order_by(),
+         "vote_route_upvote_idx"),
+        ("user's favorites", Favorite.objects.filter(user=user), "favorite_user_created_idx"),
+        ("my favorite routes", Route.objects.filter(favorites__user=user).order_by("-id"),
+         "routes_favorite_user_id_route_id"),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the hot route queries and fail if any of them stops using its index "
+        "(SQLite only; run after schema or query changes)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verbose-plans", action="store_true", help="Print every plan, not just failures.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Query plan checks are written against SQLite's EXPLAIN QUERY PLAN output.")
+
+        user = get_user_model()(pk=1)
+        failures = 0
+        for label, queryset, index in hot_queries(user):
+            plan = queryset.explain()
+            # A bare "SCAN <table>" line is a full table scan
+            ok = index in plan and not _FULL_SCAN_RE.search(plan)
+            if not ok:
+                failures += 1
+            if not ok or options["verbose_plans"]:
+                status = self.style.SUCCESS("ok") if ok else self.style.ERROR(f"expected {index}")
+                self.stdout.write(f"{label}: {status}\n  " + plan.replace("\n", "\n  "))
+
+        if failures:
+            raise CommandError(f"{failures} hot quer{'y' if failures == 1 else 'ies'} lost their index.")
+        self.stdout.write(self.style.SUCCESS("All hot queries use their indexes."))
@@ -0,0 +1,69 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from routes import images
+from routes.models import RouteImage
+from routes.storage import CAS_PREFIX, route_image_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete content-addressed route photos and variants no RouteImage refers to "
+        "(and older than ROUTE_IMAGE_ORPHAN_GRACE_SECONDS). "
+        "With --adopt-legacy, first move old per-upload files into content-addressed storage."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--adopt-legacy", action="store_true",
+                            help="Re-store pre-dedup uploads by content hash (duplicates collapse to one file).")
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be deleted without deleting.")
+
+    def _walk(self, storage, path):
+        if not storage.exists(path):
+            return
+        dirs, files = storage.listdir(path)
+        for name in files:
+            yield f"{path}{name}"
+        for sub in dirs:
+            yield from self._walk(storage, f"{path}{sub}/")
+
+    def handle(self, *args, **options):
+        storage = route_image_storage()
+        dry_run = options["dry_run"]
+
+        if options["adopt_legacy"]:
+            adopted = 0
+            for img in RouteImage.objects.exclude(image__startswith=CAS_PREFIX).order_by("id").iterator(chunk_size=200):
+                if not img.image or not storage.exists(img.image.name):
+                    continue
+                if dry_run:
+                    adopted += 1
+                    continue
+                old_name = img.image.name
+                with img.image.open("rb") as fh:
+                    new_name = storage.save(os.path.basename(old_name), fh)
+                # Keep variants pointing at the new source so they aren't rebuilt
+                variants = img.variants
+                if variants.get("source") == old_name:
+                    variants["source"] = new_name
+                RouteImage.objects.filter(pk=img.pk).update(image=new_name, variants=variants)
+                if not RouteImage.objects.filter(image=old_name).exists():
+                    storage.delete(old_name)
+                adopted += 1
+            self.stdout.write(f"Adopted {adopted} legacy upload(s) into content-addressed storage.")
+
+        referenced = set(RouteImage.objects.values_list("image", flat=True))
+        referenced_variants = set()
+        for variants in RouteImage.objects.exclude(variants={}).values_list("variants", flat=True).iterator():
+            referenced_variants.update(v["name"] for v in variants.get("sizes", {}).values())
+
+        orphans = [name for name in self._walk(storage, CAS_PREFIX) if name not in referenced]
+        orphans += [name for name in self._walk(storage, images.VARIANT_DIR) if name not in referenced_variants]
+        # Fresh files may belong to an upload or image job whose row isn't saved yet
+        orphans = [name for name in orphans if not images.recently_written(name, storage)]
+        if not dry_run:
+            for name in orphans:
+                storage.delete(name)
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(orphans)} orphaned file(s)."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from routes import images
+from routes.models import RouteImage
+
+
+class Command(BaseCommand):
+    help = "Generate thumb/medium/full WebP variants for RouteImages that are missing them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Regenerate variants even if they look current.")
+
+    def handle(self, *args, **options):
+        done = skipped = failed = 0
+        for img in RouteImage.objects.order_by("id").iterator(chunk_size=200):
+            if not options["force"] and img.has_current_variants():
+                skipped += 1
+                continue
+            if images.generate_variants(img):
+                done += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated variants for {done} image(s); {skipped} already current, {failed} failed."
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from routes import geocoding
+from routes.models import GeocodeCacheEntry
+
+
+class Command(BaseCommand):
+    help = "Show stats for the shared geocode cache, evict stale entries, or clear it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--evict", action="store_true", help="Drop expired entries and trim to the size limit.")
+        parser.add_argument("--clear", action="store_true", help="Delete every cached entry.")
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            deleted, _ = GeocodeCacheEntry.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS(f"Cleared {deleted} geocode cache entries."))
+        elif options["evict"]:
+            deleted = geocoding.evict()
+            self.stdout.write(self.style.SUCCESS(f"Evicted {deleted} geocode cache entries."))
+
+        data = geocoding.stats()
+        self.stdout.write(
+            f"entries={data['entries']} negative={data['negative_entries']} "
+            f"expired={data['expired_entries']} max={geocoding.MAX_ENTRIES}"
+        )
@@ -0,0 +1,31 @@
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+
+from routes import page_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Show hit/miss counts for the route page cache, or reset them. Needs a shared "
+        "PAGE_CACHE_BACKEND (file or redis): locmem counters live in each server process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Zero the counters after printing them.")
+
+    def handle(self, *args, **options):
+        if isinstance(page_cache._cache(), LocMemCache):
+            raise CommandError(
+                "The page cache uses the locmem backend, whose counters only exist inside each "
+                "server process; this command would always print zeros. Set PAGE_CACHE_BACKEND "
+                "to 'file' or 'redis' to collect stats across processes."
+            )
+        for view_name, counts in page_cache.stats().items():
+            ratio = "n/a" if counts["hit_ratio"] is None else f"{counts['hit_ratio']:.1%}"
+            self.stdout.write(
+                f"{view_name}: hits={counts['hits']} misses={counts['misses']} "
+                f"bypass={counts['bypass']} hit_ratio={ratio}"
+            )
+        if options["reset"]:
+            page_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from routes import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued image jobs (thumbnails, EXIF cleanup, re-encoding). Safe to run several at once."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the queue and exit instead of polling.")
+        parser.add_argument("--sleep", type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            ran = jobs.run_pending()
+            if ran:
+                self.stdout.write(f"Processed {ran} image job(s).")
+            if options["once"]:
+                break
+            if not ran:
+                time.sleep(options["sleep"])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from routes import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for routes (after bulk imports or raw SQL edits)."
+
+    def handle(self, *args, **options):
+        if not search.fts_enabled():
+            self.stdout.write("Full-text index is SQLite-only; nothing to rebuild on this database.")
+            return
+        count = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} route(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from routes.models import Route
+
+
+class Command(BaseCommand):
+    help = "Recompute Route.upvotes/downvotes/favorites_count from the Vote and Favorite tables."
+
+    def handle(self, *args, **options):
+        fixed = Route.recount_counters()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled counters; {fixed} route(s) had drifted."))
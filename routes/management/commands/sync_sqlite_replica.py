@@ -0,0 +1,40 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from routes import db_routing
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database onto the replica file (a consistent snapshot via "
+        "SQLite's backup API), once or every --interval seconds. For local replica testing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=None,
+                            help="Keep running, re-syncing this often (simulated replication lag).")
+
+    def handle(self, *args, **options):
+        if not db_routing.replica_configured():
+            raise CommandError(f"No '{db_routing.REPLICA_ALIAS}' database configured (set DB_REPLICA_NAME).")
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[db_routing.REPLICA_ALIAS]
+        if primary.vendor != "sqlite" or replica.vendor != "sqlite":
+            raise CommandError("Both databases must be SQLite; use real replication for other backends.")
+
+        while True:
+            started = time.monotonic()
+            primary.ensure_connection()
+            target = sqlite3.connect(replica.settings_dict["NAME"])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(self.style.SUCCESS(
+                f"Replica synced in {(time.monotonic() - started) * 1000:.0f} ms."
+            ))
+            if options["interval"] is None:
+                break
+            time.sleep(max(0.0, options["interval"]))
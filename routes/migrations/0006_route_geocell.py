@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+from routes.geo import grid_cell
+
+
+def backfill_geocell(apps, schema_editor):
+    Route = apps.get_model("routes", "Route")
+    routes = list(
+        Route.objects.filter(latitude__isnull=False, longitude__isnull=False)
+        .only("id", "latitude", "longitude")
+    )
+    for r in routes:
+        r.geocell = grid_cell(r.latitude, r.longitude)
+    Route.objects.bulk_update(routes, ["geocell"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0005_favorite_vote'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='geocell',
+            field=models.IntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(fields=['latitude', 'longitude'], name='route_lat_lng_idx'),
+        ),
+        migrations.RunPython(backfill_geocell, migrations.RunPython.noop),
+    ]
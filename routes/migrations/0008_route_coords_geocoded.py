@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0007_geocodecacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='coords_geocoded',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:55
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_counters(apps, schema_editor):
+    Route = apps.get_model("routes", "Route")
+    routes = list(
+        Route.objects.order_by().annotate(
+            real_up=Count("votes", filter=Q(votes__is_upvote=True), distinct=True),
+            real_down=Count("votes", filter=Q(votes__is_upvote=False), distinct=True),
+            real_favs=Count("favorites", distinct=True),
+        )
+    )
+    for r in routes:
+        r.upvotes, r.downvotes, r.favorites_count = r.real_up, r.real_down, r.real_favs
+    Route.objects.bulk_update(routes, ["upvotes", "downvotes", "favorites_count"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0008_route_coords_geocoded'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='downvotes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='upvotes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:58
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0009_route_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(django.db.models.functions.text.Lower('title'), models.F('id'), name='route_title_ci_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0010_route_title_ci_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='routeimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:02
+
+import routes.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0012_imagejob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='routeimage',
+            name='image',
+            field=models.ImageField(db_index=True, storage=routes.storage.route_image_storage, upload_to='routes/pictures/'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:10
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_at(apps, schema_editor):
+    Route = apps.get_model("routes", "Route")
+    Route.objects.update(updated_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0014_route_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='votes_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:11
+
+from django.db import migrations, models
+
+from routes.embeds import map_embed_url, parse_youtube_id
+
+
+def backfill_embeds(apps, schema_editor):
+    Route = apps.get_model("routes", "Route")
+    routes = list(Route.objects.only("id", "video_url", "latitude", "longitude", "location_name"))
+    for r in routes:
+        r.youtube_id = parse_youtube_id(r.video_url)
+        r.map_embed_url = map_embed_url(r.latitude, r.longitude, r.location_name)
+    Route.objects.bulk_update(routes, ["youtube_id", "map_embed_url"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0015_route_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='map_embed_url',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='youtube_id',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.RunPython(backfill_embeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:13
+
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0016_route_embeds'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='favorite',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='favorite_routes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='routeimage',
+            name='route',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='images', to='routes.route'),
+        ),
+        migrations.AlterField(
+            model_name='vote',
+            name='route',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='votes', to='routes.route'),
+        ),
+        migrations.AlterField(
+            model_name='vote',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='route_votes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', '-created_at'], name='favorite_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(models.F('author'), django.db.models.functions.text.Lower('title'), name='route_author_title_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(fields=['difficulty'], name='route_difficulty_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(fields=['-created_at'], name='route_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='routeimage',
+            index=models.Index(fields=['route', 'order', 'id'], name='routeimage_route_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['route', 'is_upvote'], name='vote_route_upvote_idx'),
+        ),
+    ]
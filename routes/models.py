@@ -1,8 +1,20 @@
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.core.validators import MinValueValidator, MaxValueValidator, URLValidator
-from django.db import models
-from django.db.models.functions import Lower  # NEW
-from urllib.parse import quote_plus
+from django.db import connection, models, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest, Lower, Now  # NEW
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import clustering, embeds, images, interactions, jobs, page_cache, search, sqlite_tuning, typeahead
+from .geo import grid_cell
+from .storage import CAS_PREFIX, route_image_storage
+
+COUNTER_FIELDS = ("upvotes", "downvotes", "favorites_count")
+_VOTE_STATE_FIELDS = frozenset(COUNTER_FIELDS + ("votes_changed_at",))
 
 
 class Route(models.Model):
@@ -21,6 +33,10 @@ class Route(models.Model):
     location_name = models.CharField(
         max_length=200, blank=True, help_text="e.g., Red River Gorge, KY"
     )
+    # True when lat/lng were filled in by geocoding location_name (not picked by the user)
+    coords_geocoded = models.BooleanField(default=False, editable=False)
+    # Spatial grid bucket derived from lat/lng (see routes.geo); kept in sync on save
+    geocell = models.IntegerField(blank=True, null=True, db_index=True, editable=False)
 
     # Legacy single image (optional)
     picture = models.ImageField(upload_to="routes/pictures/", blank=True, null=True)
@@ -32,29 +48,146 @@ class Route(models.Model):
         validators=[URLValidator()],
     )
 
+    # Derived from video_url / lat,lng / location_name on save (routes.embeds)
+    youtube_id = models.CharField(max_length=32, blank=True, editable=False)
+    map_embed_url = models.TextField(blank=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
+    # Change markers for conditional GETs (routes.conditional): updated_at moves on
+    # edits and image changes, votes_changed_at whenever a vote or favorite does.
+    updated_at = models.DateTimeField(auto_now=True)
+    votes_changed_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    # Denormalized counters, updated with F() expressions alongside Vote/Favorite
+    # writes (see adjust_counters); `manage.py reconcile_route_counters` fixes drift.
+    upvotes = models.PositiveIntegerField(default=0, editable=False)
+    downvotes = models.PositiveIntegerField(default=0, editable=False)
+    favorites_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = [Lower("title"), "id"]
+        indexes = [
+            models.Index(fields=["latitude", "longitude"], name="route_lat_lng_idx"),
+            # Keyset pagination for route_list (matches `ordering`)
+            models.Index(Lower("title"), "id", name="route_title_ci_id_idx"),
+            # RouteForm.clean_title: one title per author, case-insensitively
+            models.Index(F("author"), Lower("title"), name="route_author_title_ci_idx"),
+            # route_search difficulty range
+            models.Index(fields=["difficulty"], name="route_difficulty_idx"),
+            # Newest-first listings and the admin date filter
+            models.Index(fields=["-created_at"], name="route_created_at_idx"),
+        ]
 
     def __str__(self):
         return f"{self.title} (#{self.pk})"
 
+    def save(self, *args, **kwargs):
+        """
+        Updates never write the counters or votes_changed_at: the values in
+        memory may predate votes cast since the route was loaded. Only
+        adjust_counters / recount_counters change them.
+        """
+        if not self._state.adding and not kwargs.get("force_insert"):
+            update_fields = kwargs.get("update_fields")
+            if update_fields is None:
+                update_fields = [f.name for f in self._meta.concrete_fields if not f.primary_key]
+            kwargs["update_fields"] = [f for f in update_fields if f not in _VOTE_STATE_FIELDS]
+            if not kwargs["update_fields"]:
+                return
+        super().save(*args, **kwargs)
+
     # ---- Convenience getters used by templates ----
     def has_coords(self) -> bool:
         return self.latitude is not None and self.longitude is not None
 
     def get_upvotes_count(self):
         """Get the number of upvotes for this route"""
-        return self.votes.filter(is_upvote=True).count()
+        return self.upvotes
     
     def get_downvotes_count(self):
         """Get the number of downvotes for this route"""
-        return self.votes.filter(is_upvote=False).count()
+        return self.downvotes
     
     def get_net_votes(self):
         """Get the net vote count (upvotes - downvotes)"""
-        return self.get_upvotes_count() - self.get_downvotes_count()
+        return self.upvotes - self.downvotes
+
+    def image_processing_status(self) -> str | None:
+        """"processing" / "failed" while uploaded photos are being worked on, else None."""
+        statuses = set(self.image_jobs.exclude(status=ImageJob.DONE).values_list("status", flat=True))
+        if statuses & {ImageJob.PENDING, ImageJob.RUNNING}:
+            return "processing"
+        if ImageJob.FAILED in statuses:
+            return "failed"
+        return None
+
+    @classmethod
+    def adjust_counters(cls, pk, **deltas):
+        """
+        Atomically add deltas to the stored counters, e.g.
+        adjust_counters(pk, upvotes=1, downvotes=-1). Never goes below zero.
+
+        Returns the counters after the change as {"upvotes", "downvotes",
+        "favorites_count"}, or None if the route doesn't exist. Where the
+        database supports UPDATE ... RETURNING they come back from the same
+        statement.
+        """
+        changes = {field: delta for field, delta in deltas.items() if delta}
+        current = cls.objects.filter(pk=pk).values(*COUNTER_FIELDS)
+        if not changes:
+            return current.first()
+        if not connection.features.can_return_columns_from_insert:
+            cls.objects.filter(pk=pk).update(
+                votes_changed_at=Now(),
+                **{field: Greatest(F(field) + delta, 0) for field, delta in changes.items()},
+            )
+            return current.first()
+
+        qn = connection.ops.quote_name
+        assignments, params = [], []
+        for field, delta in changes.items():
+            col = qn(cls._meta.get_field(field).column)
+            assignments.append(f"{col} = CASE WHEN {col} + %s > 0 THEN {col} + %s ELSE 0 END")
+            params += [delta, delta]
+        assignments.append(f"{qn('votes_changed_at')} = %s")
+        params += [connection.ops.adapt_datetimefield_value(timezone.now()), pk]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {qn(cls._meta.db_table)} SET {', '.join(assignments)} "
+                f"WHERE {qn('id')} = %s RETURNING {', '.join(qn(f) for f in COUNTER_FIELDS)}",
+                params,
+            )
+            row = cursor.fetchone()
+        return dict(zip(COUNTER_FIELDS, row)) if row else None
+
+    @classmethod
+    def touch(cls, pk):
+        """Mark a route as changed (e.g. its images) without saving the whole row."""
+        cls.objects.filter(pk=pk).update(updated_at=Now())
+
+    @classmethod
+    def recount_counters(cls, queryset=None):
+        """
+        Recompute the stored counters from the Vote/Favorite tables. Returns the
+        number of routes whose counters had drifted and were fixed.
+        """
+        queryset = cls.objects.all() if queryset is None else queryset
+        actual = queryset.order_by().annotate(
+            real_up=Count("votes", filter=Q(votes__is_upvote=True), distinct=True),
+            real_down=Count("votes", filter=Q(votes__is_upvote=False), distinct=True),
+            real_favs=Count("favorites", distinct=True),
+        ).only("id", "upvotes", "downvotes", "favorites_count")
+
+        drifted = []
+        for r in actual.iterator(chunk_size=2000):
+            if (r.upvotes, r.downvotes, r.favorites_count) != (r.real_up, r.real_down, r.real_favs):
+                r.upvotes, r.downvotes, r.favorites_count = r.real_up, r.real_down, r.real_favs
+                r.votes_changed_at = timezone.now()
+                drifted.append(r)
+        cls.objects.bulk_update(
+            drifted, ["upvotes", "downvotes", "favorites_count", "votes_changed_at"], batch_size=500
+        )
+        return len(drifted)
     
     def get_user_vote(self, user):
         """Get the current user's vote on this route (None, True for upvote, False for downvote)"""
@@ -72,80 +205,187 @@ class Route(models.Model):
             return False
         return self.favorites.filter(user=user).exists()
 
-    def youtube_id(self) -> str | None:
-        """Extract the YouTube video id from watch / youtu.be / embed / shorts / live / mobile URLs."""
-        if not getattr(self, "video_url", None):
-            return None
-        url = (self.video_url or "").strip()
-        url = url.replace("m.youtube.com", "www.youtube.com")
-
-        import re as _re
-        patterns = [
-            r"youtube\.com/watch\?[^#]*v=([A-Za-z0-9_-]{6,})",
-            r"youtu\.be/([A-Za-z0-9_-]{6,})",
-            r"youtube\.com/embed/([A-Za-z0-9_-]{6,})",
-            r"youtube\.com/shorts/([A-Za-z0-9_-]{6,})",
-            r"youtube\.com/live/([A-Za-z0-9_-]{6,})",
-        ]
-        for pat in patterns:
-            m = _re.search(pat, url)
-            if m:
-                return m.group(1)
-        return None
-
+    # Embeds: parsed once on save (see set_route_embeds), so rendering is a lookup
+    @property
     def youtube_embed_src(self) -> str | None:
-        """Return an embeddable YouTube URL for many URL shapes."""
-        vid = self.youtube_id()
-        if not vid:
+        """Embeddable YouTube URL, or None if video_url isn't a recognizable video."""
+        if not self.youtube_id:
             return None
-        # Standard embed domain with safe params
-        params = "rel=0&modestbranding=1&playsinline=1&iv_load_policy=3"
-        return f"https://www.youtube.com/embed/{vid}?{params}"
+        return f"https://www.youtube.com/embed/{self.youtube_id}?{embeds.YOUTUBE_EMBED_PARAMS}"
 
+    @property
     def map_embed_src(self) -> str | None:
-        """
-        Prefer precise lat/long; otherwise search by name.
-        Returns an embeddable Google Maps URL suitable for an <iframe>.
-        """
-        if self.has_coords():
-            try:
-                lat = float(self.latitude)
-                lng = float(self.longitude)
-            except (TypeError, ValueError):
-                lat = lng = None
-            if (
-                lat is not None
-                and -90.0 <= lat <= 90.0
-                and lng is not None
-                and -180.0 <= lng <= 180.0
-            ):
-                return f"https://www.google.com/maps?q={lat},{lng}&z=14&output=embed"
-
-        if self.location_name:
-            q = quote_plus(self.location_name.strip())
-            return f"https://www.google.com/maps?q={q}&z=14&output=embed"
-        return None
+        """Embeddable Google Maps URL (lat/long if set, else the location name)."""
+        return self.map_embed_url or None
+
+
+@receiver(pre_save, sender=Route)
+def set_route_geocell(sender, instance, **kwargs):
+    """Keep Route.geocell in sync with lat/lng (also for fixtures loaded raw)."""
+    instance.geocell = grid_cell(instance.latitude, instance.longitude)
+
+
+@receiver(pre_save, sender=Route)
+def set_route_embeds(sender, instance, **kwargs):
+    """Parse video_url / location into the stored embed fields (also for fixtures loaded raw)."""
+    instance.youtube_id = embeds.parse_youtube_id(instance.video_url)
+    instance.map_embed_url = embeds.map_embed_url(
+        instance.latitude, instance.longitude, instance.location_name
+    )
+
+
+@receiver(pre_save, sender=Route)
+def fill_route_updated_at(sender, instance, raw=False, **kwargs):
+    """auto_now is skipped for fixtures loaded raw; start them at created_at."""
+    if raw and instance.updated_at is None:
+        instance.updated_at = instance.created_at or timezone.now()
+
+
+@receiver(pre_save, sender=Route)
+def remember_route_position(sender, instance, raw=False, **kwargs):
+    """Note where an existing route was, so its old cluster tiles can be dropped too."""
+    instance._old_coords = None
+    if instance.pk and not raw:
+        instance._old_coords = (
+            Route.objects.filter(pk=instance.pk).values_list("latitude", "longitude").first()
+        )
+
+
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+def invalidate_route_clusters(sender, instance, **kwargs):
+    """Drop precomputed map cluster tiles touched by this route, once the change commits."""
+    if kwargs.get("raw", False):
+        transaction.on_commit(clustering.invalidate_all)
+        return
+    points = [(instance.latitude, instance.longitude)]
+    old = getattr(instance, "_old_coords", None)
+    if old and old != points[0]:
+        points.append(old)
+
+    def invalidate():
+        for lat, lng in points:
+            clustering.invalidate_point(lat, lng)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Route)
+def index_route_text(sender, instance, update_fields=None, **kwargs):
+    """Keep the full-text index (routes.search) in step with the route's text."""
+    if update_fields is not None and not set(update_fields) & set(search.INDEXED_FIELDS):
+        return
+    search.index_route(instance)
+
+
+@receiver(post_delete, sender=Route)
+def unindex_route_text(sender, instance, **kwargs):
+    search.unindex_route(instance.pk)
+
+
+_TYPEAHEAD_FIELDS = {"title", "location_name", "upvotes", "downvotes"}
+
+
+@receiver(post_save, sender=Route)
+def update_route_typeahead(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & _TYPEAHEAD_FIELDS:
+        return
+    typeahead.index.upsert(instance)
+
+
+@receiver(post_delete, sender=Route)
+def remove_route_typeahead(sender, instance, **kwargs):
+    typeahead.index.remove(instance.pk)
 
 
 class RouteImage(models.Model):
-    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name="images")
-    image = models.ImageField(upload_to="routes/pictures/")
+    # Indexed by routeimage_route_order_idx below
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name="images", db_index=False)
+    # Content-addressed: the stored name is the SHA-256 of the bytes plus the
+    # extension the upload handler sniffed, so identical uploads share one file
+    image = models.ImageField(upload_to=CAS_PREFIX, storage=route_image_storage, db_index=True)
     alt_text = models.CharField(max_length=200, blank=True)
     order = models.PositiveSmallIntegerField(default=0)
+    # Resized WebP derivatives written by routes.images: {"source": ..., "sizes": {name: {name, width, height}}}
+    variants = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         ordering = ["order", "id"]
+        indexes = [
+            # Prefetching a page's images comes back already in display order
+            models.Index(fields=["route", "order", "id"], name="routeimage_route_order_idx"),
+        ]
 
     def __str__(self):
         return f"Image for {self.route.title} (#{self.pk})"
 
+    # ---- Variant URLs used by templates (fall back to the original upload) ----
+    def has_current_variants(self) -> bool:
+        return bool(self.variants) and self.variants.get("source") == self.image.name
+
+    def variant_url(self, name: str) -> str:
+        if self.has_current_variants():
+            entry = self.variants["sizes"].get(name)
+            if entry:
+                return default_storage.url(entry["name"])
+        return self.image.url
+
+    @property
+    def thumb_url(self) -> str:
+        return self.variant_url("thumb")
+
+    @property
+    def medium_url(self) -> str:
+        return self.variant_url("medium")
+
+    @property
+    def full_url(self) -> str:
+        return self.variant_url("full")
+
+    @property
+    def srcset(self) -> str:
+        """`srcset` value listing each distinct variant width ("" until variants exist)."""
+        if not self.has_current_variants():
+            return ""
+        seen = {}
+        for entry in self.variants["sizes"].values():
+            seen.setdefault(entry["name"], entry["width"])
+        return ", ".join(f"{default_storage.url(name)} {width}w" for name, width in seen.items())
+
+
+@receiver(post_save, sender=RouteImage)
+def queue_route_image_processing(sender, instance, raw=False, **kwargs):
+    """Queue thumbnails/cleanup when an image is added or its file changes."""
+    if raw or not instance.image or instance.has_current_variants():
+        return
+    # Enqueue only once the upload's transaction commits, so a worker can see the row
+    transaction.on_commit(lambda: jobs.enqueue_image(instance))
+
+
+@receiver(post_delete, sender=RouteImage)
+def delete_route_image_files(sender, instance, **kwargs):
+    """
+    Garbage-collect the original and its variants once no other row shares
+    them. Runs per row for queryset deletes too (route.images.all().delete()),
+    and only after commit so a rolled-back delete keeps its files.
+    """
+    name = instance.image.name
+
+    def collect():
+        images.delete_variants(instance)
+        images.release_original(name, instance.image.storage)
+
+    transaction.on_commit(collect)
+
 
 class Favorite(models.Model):
     """Model to track users' favorite routes"""
+    # user_id lookups use the (user, route) unique index; no separate FK index
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, 
         on_delete=models.CASCADE, 
-        related_name="favorite_routes"
+        related_name="favorite_routes",
+        db_index=False,
     )
     route = models.ForeignKey(
         Route, 
@@ -157,22 +397,45 @@ class Favorite(models.Model):
     class Meta:
         unique_together = ('user', 'route')  # Prevent duplicate favorites
         ordering = ['-created_at']
+        indexes = [
+            # A user's favorites, newest first (the default ordering)
+            models.Index(fields=["user", "-created_at"], name="favorite_user_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} favorites {self.route.title}"
 
+    @classmethod
+    def toggle(cls, user, route_id):
+        """
+        Favorite the route, or unfavorite it if it already was. Returns
+        (is_favorited, counters), counters as from Route.adjust_counters
+        (None if the route doesn't exist; roll back then). Call inside a
+        transaction.
+        """
+        inserted = interactions.insert_ignoring_conflict(
+            cls, user_id=user.pk, route_id=route_id, created_at=timezone.now(),
+        )
+        removed = not inserted and interactions.delete_rows(cls, user_id=user.pk, route_id=route_id)
+        counters = Route.adjust_counters(route_id, favorites_count=inserted - removed)
+        page_cache.invalidate_route(route_id)  # raw writes skip the receivers below
+        return inserted, counters
+
 
 class Vote(models.Model):
     """Model to track user votes (upvotes/downvotes) on routes"""
+    # Both FKs are covered by composite indexes (unique_together, vote_route_upvote_idx)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, 
         on_delete=models.CASCADE, 
-        related_name="route_votes"
+        related_name="route_votes",
+        db_index=False,
     )
     route = models.ForeignKey(
         Route, 
         on_delete=models.CASCADE, 
-        related_name="votes"
+        related_name="votes",
+        db_index=False,
     )
     is_upvote = models.BooleanField()  # True for upvote, False for downvote
     created_at = models.DateTimeField(auto_now_add=True)
@@ -181,7 +444,124 @@ class Vote(models.Model):
     class Meta:
         unique_together = ('user', 'route')  # One vote per user per route
         ordering = ['-updated_at']
+        indexes = [
+            # recount_counters: per-route up/down tallies straight from the index
+            models.Index(fields=["route", "is_upvote"], name="vote_route_upvote_idx"),
+        ]
 
     def __str__(self):
         vote_type = "upvote" if self.is_upvote else "downvote"
         return f"{self.user.username} {vote_type}s {self.route.title}"
+
+    @classmethod
+    def toggle(cls, user, route_id, is_upvote):
+        """
+        One click on an up/down button: add the vote, switch its direction, or
+        take it back if it already pointed that way. Returns (user_vote,
+        counters), user_vote being None, True or False and counters as from
+        Route.adjust_counters (None if the route doesn't exist; roll back then).
+
+        Call inside a transaction. The first statement is already a write, so
+        on SQLite the transaction holds the write lock from there on and
+        concurrent clicks queue up instead of racing. A new vote, the common
+        case, takes two statements including the counter update.
+        """
+        now = timezone.now()
+        up, down = (1, 0) if is_upvote else (0, 1)
+        if interactions.insert_ignoring_conflict(
+            cls, user_id=user.pk, route_id=route_id, is_upvote=is_upvote, created_at=now, updated_at=now,
+        ):
+            user_vote = is_upvote
+        elif cls.objects.filter(user=user, route_id=route_id, is_upvote=not is_upvote).update(
+            is_upvote=is_upvote, updated_at=now,
+        ):
+            user_vote = is_upvote
+            up, down = (1, -1) if is_upvote else (-1, 1)
+        elif interactions.delete_rows(cls, user_id=user.pk, route_id=route_id, is_upvote=is_upvote):
+            user_vote = None
+            up, down = -up, -down
+        else:
+            # A concurrent request removed it between our statements: nothing left to undo
+            user_vote, up, down = None, 0, 0
+        counters = Route.adjust_counters(route_id, upvotes=up, downvotes=down)
+        page_cache.invalidate_route(route_id)  # raw writes skip the receivers below
+        return user_vote, counters
+
+
+
+@receiver(post_save, sender=RouteImage)
+@receiver(post_delete, sender=RouteImage)
+def touch_route_on_image_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Route.touch(instance.route_id)
+
+
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+def invalidate_route_pages(sender, instance, **kwargs):
+    page_cache.invalidate_route(instance.pk)
+
+
+@receiver(post_save, sender=RouteImage)
+@receiver(post_delete, sender=RouteImage)
+@receiver(post_save, sender=Vote)
+@receiver(post_delete, sender=Vote)
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def invalidate_related_route_pages(sender, instance, **kwargs):
+    """Images, vote counts and favorite state all show on the cached route pages."""
+    page_cache.invalidate_route(instance.route_id)
+
+
+class GeocodeCacheEntry(models.Model):
+    """Shared cache of server-side geocoding results (see routes.geocoding)"""
+    key = models.CharField(max_length=255, unique=True)  # normalized location text
+    latitude = models.FloatField(blank=True, null=True)  # null = no match (negative entry)
+    longitude = models.FloatField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ["key"]
+
+    def __str__(self):
+        if self.latitude is None or self.longitude is None:
+            return f"{self.key} (no match)"
+        return f"{self.key} ({self.latitude}, {self.longitude})"
+
+
+class ImageJob(models.Model):
+    """Queued post-upload work for a RouteImage (see routes.jobs)"""
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name="image_jobs")
+    route_image = models.ForeignKey(RouteImage, on_delete=models.CASCADE, related_name="jobs")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["status", "id"], name="imagejob_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"Image job #{self.pk} ({self.status}) for {self.route_image_id}"
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    sqlite_tuning.configure_connection(connection)
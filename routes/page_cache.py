@@ -0,0 +1,171 @@
+"""
+Whole-response caching for the public route pages (route_list, route_detail,
+anonymous home).
+
+Entries are keyed by view, query string and audience: one shared copy for
+anonymous visitors, one per session for logged-in users (their pages show
+their own votes, favorites and CSRF token). Each page also depends on
+"scopes" (the catalog, or one route) whose version numbers are part of the key.
+Saving or deleting a Route, RouteImage, Vote or Favorite bumps the versions
+(see the receivers in routes.models), so stale entries are never read again
+and simply age out.
+
+Requests with pending flash messages bypass the cache in both directions.
+Hit/miss counts per view are kept in the cache too; see stats() and
+`manage.py page_cache_stats`.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+
+TIMEOUT = getattr(settings, "PAGE_CACHE_TIMEOUT", 300)
+CATALOG = "catalog"
+
+_PREFIX = "page-cache"
+
+
+def _cache():
+    return caches[getattr(settings, "PAGE_CACHE_ALIAS", "default")]
+
+
+def route_scope(pk) -> str:
+    return f"route:{pk}"
+
+
+def _version_key(scope: str) -> str:
+    return f"{_PREFIX}:v:{scope}"
+
+
+def _versions(scopes) -> list:
+    cache = _cache()
+    keys = [_version_key(s) for s in scopes]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            # Start from the clock, so a version lost to eviction can't reuse old keys
+            cache.add(key, int(time.time() * 1000), timeout=None)
+            found[key] = cache.get(key)
+        versions.append(found[key])
+    return versions
+
+
+def catalog_version():
+    """Changes whenever any route-related data does (usable as a cheap validator)."""
+    return _versions([CATALOG])[0]
+
+
+def invalidate(*scopes) -> None:
+    """Make every cached page that depends on these scopes unreachable."""
+    cache = _cache()
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000), timeout=None)
+
+
+def invalidate_route(pk) -> None:
+    """
+    A route (or something shown on its page or in listings) changed. Deferred
+    to commit, so a concurrent request can't re-cache the pre-commit page.
+    """
+    transaction.on_commit(lambda: invalidate(CATALOG, route_scope(pk)))
+
+
+def _count(view_name: str, outcome: str) -> None:
+    cache = _cache()
+    key = f"{_PREFIX}:stats:{view_name}:{outcome}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def stats() -> dict:
+    """{view_name: {"hits", "misses", "bypass", "hit_ratio"}} for the cached views."""
+    cache = _cache()
+    result = {}
+    for view_name in sorted(_registered):
+        counts = {
+            outcome: cache.get(f"{_PREFIX}:stats:{view_name}:{outcome}", 0)
+            for outcome in ("hits", "misses", "bypass")
+        }
+        looked_up = counts["hits"] + counts["misses"]
+        counts["hit_ratio"] = round(counts["hits"] / looked_up, 3) if looked_up else None
+        result[view_name] = counts
+    return result
+
+
+def reset_stats() -> None:
+    _cache().delete_many([
+        f"{_PREFIX}:stats:{view_name}:{outcome}"
+        for view_name in _registered for outcome in ("hits", "misses", "bypass")
+    ])
+
+
+_registered = set()
+
+
+def audience(request) -> str:
+    """Who a rendered page is for: the session (its CSRF token rotates on login), or "anon"."""
+    if request.user.is_authenticated:
+        return "s:" + hashlib.sha256(request.session.session_key.encode()).hexdigest()[:16]
+    return "anon"
+
+
+def cached_page(scopes, anonymous_only=False, timeout=None):
+    """
+    View decorator. `scopes(request, *args, **kwargs)` returns the scopes the
+    page depends on, e.g. lambda request, pk: [CATALOG, route_scope(pk)].
+    """
+    def decorator(view):
+        view_name = view.__name__
+        _registered.add(view_name)
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            authenticated = request.user.is_authenticated
+            if (
+                request.method not in ("GET", "HEAD")
+                or (anonymous_only and authenticated)
+                or len(messages.get_messages(request))  # doesn't consume them
+            ):
+                _count(view_name, "bypass")
+                return view(request, *args, **kwargs)
+
+            versions = _versions(scopes(request, *args, **kwargs))
+            query = hashlib.sha256(request.META.get("QUERY_STRING", "").encode()).hexdigest()[:16]
+            key = f"{_PREFIX}:{view_name}:{':'.join(map(str, versions))}:{audience(request)}:{query}"
+
+            cache = _cache()
+            entry = cache.get(key)
+            if entry is not None:
+                _count(view_name, "hits")
+                content, content_type, status = entry
+                response = HttpResponse(content, content_type=content_type, status=status)
+                response["X-Page-Cache"] = "hit"
+                return response
+
+            _count(view_name, "misses")
+            response = view(request, *args, **kwargs)
+            # Anonymous pages are shared, so never store one that handed out a CSRF token
+            shareable = authenticated or not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+            if response.status_code == 200 and not response.streaming and shareable:
+                cache.set(
+                    key,
+                    (response.content, response.get("Content-Type"), response.status_code),
+                    timeout=TIMEOUT if timeout is None else timeout,
+                )
+            response["X-Page-Cache"] = "miss"
+            return response
+
+        return wrapped
+    return decorator
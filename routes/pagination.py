@@ -0,0 +1,152 @@
+"""
+Keyset (cursor) pagination for route listings.
+
+Instead of OFFSET, each page remembers the sort key of its first/last row and
+the next query asks for rows strictly after (or before) it, so page 500 costs
+the same as page 1 as long as the ordering is backed by an index.
+"""
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+PAGE_SIZE = 20
+
+
+class KeysetPage:
+    """One page of results plus opaque cursors for its neighbours."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def _encode(direction: str, key: list) -> str:
+    raw = json.dumps([direction, key], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode(cursor: str | None, n_keys: int):
+    """Returns (direction, key) or (None, None) for a missing/garbled cursor."""
+    if not cursor:
+        return None, None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        direction, key = json.loads(raw)
+    except (ValueError, TypeError):
+        return None, None
+    if direction not in ("n", "p") or not isinstance(key, list) or len(key) != n_keys:
+        return None, None
+    return direction, key
+
+
+def _typed(queryset, keys, values):
+    """
+    Convert cursor values with each key's field, or return None if any of
+    them doesn't fit (a tampered cursor is treated like a garbled one).
+    """
+    converted = []
+    for (name, _), value in zip(keys, values):
+        if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+            return None
+        annotation = queryset.query.annotations.get(name)
+        try:
+            field = annotation.output_field if annotation is not None else queryset.model._meta.get_field(name)
+            converted.append(field.to_python(value))
+        except (FieldDoesNotExist, ValidationError, TypeError, ValueError):
+            return None
+    return converted
+
+
+def _after(keys, values, reverse: bool) -> Q:
+    """
+    Row-value comparison `(k1, k2, ...) > (v1, v2, ...)` honouring each key's
+    direction, written as `k1 >= v1 AND (k1 > v1 OR (k1 = v1 AND k2 > v2) ...)`:
+    SQLite can't seek an index with the bare OR, but the leading range bound
+    lets it start at the cursor instead of walking from the first row.
+    """
+    condition = Q()
+    for i, (name, descending) in enumerate(keys):
+        lookup = "lt" if descending != reverse else "gt"
+        step = Q(**{f"{name}__{lookup}": values[i]})
+        for j in range(i):
+            step &= Q(**{keys[j][0]: values[j]})
+        condition |= step
+    if len(keys) > 1:
+        name, descending = keys[0]
+        lookup = "lte" if descending != reverse else "gte"
+        condition = Q(**{f"{name}__{lookup}": values[0]}) & condition
+    return condition
+
+
+def keyset_paginate(queryset, keys, cursor=None, per_page=PAGE_SIZE) -> KeysetPage:
+    """
+    Paginate `queryset` by `keys`, a list of (field_or_alias, descending) pairs
+    that must end in a unique field (usually "id"). Expression keys such as
+    Lower("title") should be annotated onto the queryset under an alias first.
+    """
+    direction, key = _decode(cursor, len(keys))
+    if key is not None:
+        key = _typed(queryset, keys, key)
+        if key is None:
+            direction = None
+    reverse = direction == "p"
+
+    order = []
+    for name, descending in keys:
+        order.append(f"-{name}" if descending != reverse else name)
+    qs = queryset.order_by(*order)
+    if key is not None:
+        qs = qs.filter(_after(keys, key, reverse))
+
+    rows = list(qs[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if reverse:
+        rows.reverse()
+
+    def key_of(obj):
+        return [getattr(obj, name) for name, _ in keys]
+
+    next_cursor = previous_cursor = None
+    if rows:
+        if has_more or reverse:
+            next_cursor = _encode("n", key_of(rows[-1]))
+        if (has_more and reverse) or direction == "n":
+            previous_cursor = _encode("p", key_of(rows[0]))
+    return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin: paginate with keyset cursors (?cursor=) instead of page
+    numbers. Set `keyset_keys` and optionally `paginate_by`.
+    """
+    keyset_keys = [("id", True)]
+    paginate_by = PAGE_SIZE
+
+    def paginate_queryset(self, queryset, page_size):
+        page = keyset_paginate(
+            queryset, self.keyset_keys, self.request.GET.get("cursor"), page_size
+        )
+        return None, page, page.object_list, page.has_other_pages
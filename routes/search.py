@@ -0,0 +1,130 @@
+"""
+Full-text search over Route.title, description and location_name.
+
+On SQLite the text lives in an FTS5 table, routes_route_fts (rowid = route
+id), created by migration 0014 and kept in sync by the Route post_save /
+post_delete receivers. It is a plain (not external-content) FTS table on
+purpose: Django rebuilds routes_route on SQLite for many schema changes,
+which would silently drop triggers, and a self-contained table can be
+updated by rowid without knowing the old text. `manage.py
+rebuild_route_search` re-indexes everything after bulk writes.
+
+Other databases fall back to icontains filtering (unranked beyond votes).
+"""
+import re
+
+from django.db import connection
+from django.db.models import F, Q
+
+FTS_TABLE = "routes_route_fts"
+MAX_RESULTS = 500
+MAX_TERMS = 8
+INDEXED_FIELDS = ("title", "description", "location_name")
+# bm25 column weights, in INDEXED_FIELDS order: a title hit beats a description hit
+_WEIGHTS = (10.0, 1.0, 4.0)
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_enabled() -> bool:
+    return connection.vendor == "sqlite"
+
+
+def match_query(text: str) -> str | None:
+    """
+    Turn user input into a safe FTS5 MATCH expression: every word must match
+    (each one quoted, so FTS syntax in the input is inert) and the last word
+    is a prefix so partial typing still finds things.
+    """
+    terms = _TERM_RE.findall((text or "").casefold())[:MAX_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def ranked_route_ids(text: str, limit: int | None = MAX_RESULTS, difficulty=None) -> list[int]:
+    """
+    Ids of routes matching `text`, best match first. `difficulty` is an
+    inclusive (min, max) range applied in the same statement, so the limit
+    counts only routes that pass it; None for no limit.
+    """
+    if not fts_enabled():
+        return _fallback_ids(text, limit, difficulty)
+    query = match_query(text)
+    if query is None:
+        return []
+    sql = f"SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE}"
+    params = []
+    if difficulty is not None:
+        sql += f" JOIN routes_route ON routes_route.id = {FTS_TABLE}.rowid"
+    sql += f" WHERE {FTS_TABLE} MATCH %s"
+    params.append(query)
+    if difficulty is not None:
+        sql += " AND routes_route.difficulty BETWEEN %s AND %s"
+        params.extend(difficulty)
+    sql += f" ORDER BY bm25({FTS_TABLE}, %s, %s, %s)"
+    params.extend(_WEIGHTS)
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_ids(text: str, limit: int | None, difficulty=None) -> list[int]:
+    from .models import Route
+
+    terms = _TERM_RE.findall(text or "")[:MAX_TERMS]
+    if not terms:
+        return []
+    condition = Q()
+    for term in terms:
+        condition &= (
+            Q(title__icontains=term) | Q(description__icontains=term) | Q(location_name__icontains=term)
+        )
+    if difficulty is not None:
+        condition &= Q(difficulty__gte=difficulty[0], difficulty__lte=difficulty[1])
+    ids = (
+        Route.objects.filter(condition)
+        .order_by((F("upvotes") - F("downvotes")).desc(), "-id")
+        .values_list("id", flat=True)
+    )
+    return list(ids if limit is None else ids[:limit])
+
+
+def index_route(route) -> None:
+    """(Re)write one route's row in the FTS table."""
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [route.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description, location_name) VALUES (%s, %s, %s, %s)",
+            [route.pk, route.title or "", route.description or "", route.location_name or ""],
+        )
+
+
+def unindex_route(pk) -> None:
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [pk])
+
+
+def rebuild(schema_editor=None) -> int:
+    """Re-index every route from scratch. Returns the number of rows indexed."""
+    conn = schema_editor.connection if schema_editor else connection
+    if conn.vendor != "sqlite":
+        return 0
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description, location_name) "
+            "SELECT id, title, COALESCE(description, ''), COALESCE(location_name, '') FROM routes_route"
+        )
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
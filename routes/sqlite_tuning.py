@@ -0,0 +1,42 @@
+"""
+Per-connection SQLite settings for running under several workers.
+
+Applied by the connection_created receiver in routes.models, so every new
+connection (and, with CONN_MAX_AGE, every reused one) runs in WAL mode:
+readers no longer block the writer and vice versa, and a writer that finds
+the database locked waits up to busy_timeout instead of failing with
+"database is locked". Writes still serialize, so the settings also make
+transactions BEGIN IMMEDIATE (DATABASES OPTIONS "transaction_mode"): a
+transaction that reads first can't end up unable to upgrade to a write
+lock, which busy_timeout can't help with.
+
+SQLITE_PRAGMAS in settings replaces DEFAULT_PRAGMAS; see also
+`manage.py bench_sqlite_writes`.
+"""
+from django.conf import settings
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "wal",        # persistent in the file; readers don't block the writer
+    "synchronous": "normal",      # safe with WAL; fsync at checkpoints, not every commit
+    "busy_timeout": 5000,         # ms to wait for the write lock
+    "cache_size": -64 * 1024,     # negative = KiB, so 64 MiB of page cache per connection
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "memory",
+}
+
+
+def pragmas() -> dict:
+    return getattr(settings, "SQLITE_PRAGMAS", DEFAULT_PRAGMAS)
+
+
+def pragma_statements(values=None) -> list[str]:
+    values = pragmas() if values is None else values
+    return [f"PRAGMA {name} = {value}" for name, value in values.items()]
+
+
+def configure_connection(connection) -> None:
+    if connection.vendor != "sqlite":
+        return
+    # On the raw DB-API connection: setup, not queries (and not seen by execute wrappers)
+    for statement in pragma_statements():
+        connection.connection.execute(statement).fetchall()
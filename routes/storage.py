@@ -0,0 +1,66 @@
+"""
+Content-addressed storage for RouteImage uploads.
+
+Files are stored as routes/cas/<aa>/<sha256><ext>, so identical bytes are only
+written once no matter how many routes (or re-uploads) use them. The
+RouteImage rows pointing at a name act as its reference count; see
+routes.images.release_original for the garbage-collection side.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CAS_PREFIX = "routes/cas/"
+# Where routes.uploads spools incoming files (same filesystem, so saving is a rename)
+UPLOAD_TMP_DIR = "routes/tmp/"
+
+
+def is_cas_name(name: str | None) -> bool:
+    return bool(name) and name.startswith(CAS_PREFIX)
+
+
+def content_digest(content) -> str:
+    digest = hashlib.sha256()
+    if hasattr(content, "seek"):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    if hasattr(content, "seek"):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files by the SHA-256 of their bytes."""
+
+    def save(self, name, content, max_length=None):
+        if content is None:
+            return super().save(name, content, max_length)
+        if not hasattr(content, "chunks"):
+            from django.core.files import File
+            content = File(content, name)
+
+        ext = os.path.splitext(name or "")[1].lower()
+        # Streamed uploads (routes.uploads) were hashed while they arrived
+        digest = getattr(content, "sha256", None) or content_digest(content)
+        target = f"{CAS_PREFIX}{digest[:2]}/{digest}{ext}"
+        if self.exists(target):
+            try:
+                # Already stored: nothing to write, but a fresh mtime keeps the GC off it
+                # until the new reference is saved (routes.images.ORPHAN_GRACE_SECONDS)
+                os.utime(self.path(target))
+                return target
+            except FileNotFoundError:
+                pass  # released in between; write it again
+        return super().save(target, content, max_length)
+
+
+_storage = ContentAddressedStorage()
+
+
+def route_image_storage():
+    """Storage callable for RouteImage.image (keeps migrations free of instances)."""
+    return _storage
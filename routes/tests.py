@@ -0,0 +1,601 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from routes import embeds, geocoding, images, instrumentation, interactions, jobs, search, typeahead, uploads
+from routes.geo import grid_cell
+from routes.management.commands.check_query_plans import _FULL_SCAN_RE, hot_queries
+from routes.models import Favorite, GeocodeCacheEntry, Route, RouteImage, Vote
+from routes.storage import CAS_PREFIX, UPLOAD_TMP_DIR, route_image_storage
+
+User = get_user_model()
+
+MANY = 12
+
+
+def _clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+class QueryCountTests(TestCase):
+    """The hot pages cost the same number of queries for 1 route as for many."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("climber", password="x")
+        cls.voters = [User.objects.create_user(f"voter{i}", password="x") for i in range(MANY)]
+
+    def setUp(self):
+        _clear_caches()
+        self.client.force_login(self.user)
+
+    def _add_routes(self, count, start=0):
+        routes = []
+        for i in range(start, start + count):
+            route = Route.objects.create(
+                author=self.user, title=f"Route {i}", description="Crack line", difficulty=i % 10 + 1,
+                latitude=40.0 + i / 100, longitude=-105.0 - i / 100, location_name="Boulder, CO",
+            )
+            Vote.objects.create(user=self.user, route=route, is_upvote=bool(i % 2))
+            Favorite.objects.create(user=self.user, route=route)
+            routes.append(route)
+        return routes
+
+    def _queries(self, method, url, data=None):
+        _clear_caches()
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data or {})
+        self.assertLess(response.status_code, 400, url)
+        return len(ctx)
+
+    def _assert_constant(self, method, url, data=None):
+        self._add_routes(1)
+        one = self._queries(method, url, data)
+        self._add_routes(MANY - 1, start=1)
+        with self.assertNumQueries(one):
+            _clear_caches()
+            getattr(self.client, method)(url, data or {})
+
+    def test_home(self):
+        self._assert_constant("get", reverse("home"))
+
+    def test_route_list(self):
+        self._assert_constant("get", reverse("routes:list"))
+
+    def test_map_data_markers(self):
+        self._assert_constant("get", reverse("routes:map_data"), {"bbox": "-106,39,-104,41", "zoom": 12})
+
+    def test_map_data_clusters(self):
+        self._assert_constant("get", reverse("routes:map_data"), {"bbox": "-180,-85,180,85", "zoom": 3})
+
+    def test_vote_does_not_depend_on_existing_votes(self):
+        quiet, busy = self._add_routes(2)
+        for voter in self.voters:
+            Vote.objects.create(user=voter, route=busy, is_upvote=True)
+        Vote.objects.filter(user=self.user).delete()
+        # New vote, switch, take back
+        for is_upvote in ("true", "false", "false"):
+            with self.subTest(is_upvote=is_upvote):
+                expected = self._queries("post", reverse("routes:vote", args=[quiet.pk]), {"is_upvote": is_upvote})
+                self.assertEqual(
+                    self._queries("post", reverse("routes:vote", args=[busy.pk]), {"is_upvote": is_upvote}),
+                    expected,
+                )
+
+
+@mock.patch.object(instrumentation, "STRICT", True)
+class QueryBudgetTests(TestCase):
+    """VIEW_QUERY_BUDGETS hold on the hot paths with a catalog and activity."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("climber", password="x")
+        cls.routes = [
+            Route.objects.create(
+                author=cls.user, title=f"Route {i}", description="Slab", difficulty=3,
+                latitude=40.0 + i / 100, longitude=-105.0,
+            )
+            for i in range(MANY)
+        ]
+        for route in cls.routes[::2]:
+            Favorite.objects.create(user=cls.user, route=route)
+
+    def setUp(self):
+        _clear_caches()
+        self.client.force_login(self.user)
+
+    def test_read_pages_within_budget(self):
+        route = self.routes[0]
+        for url in (
+            reverse("home"),
+            reverse("routes:list"),
+            reverse("routes:detail", args=[route.pk]),
+            reverse("routes:search") + "?q=slab",
+            reverse("routes:map_data") + "?bbox=-106,39,-104,41&zoom=12",
+            reverse("routes:map_data") + "?bbox=-180,-85,180,85&zoom=3",
+            reverse("routes:my_routes"),
+            reverse("routes:my_favorite_routes"),
+            reverse("routes:edit", args=[route.pk]),
+        ):
+            with self.subTest(url=url):
+                _clear_caches()
+                self.assertLess(self.client.get(url).status_code, 400)
+
+    def test_vote_and_favorite_branches_within_budget(self):
+        route = self.routes[1]
+        vote_url = reverse("routes:vote", args=[route.pk])
+        for is_upvote in ("true", "true", "true", "false", "false"):
+            self.assertEqual(self.client.post(vote_url, {"is_upvote": is_upvote}).status_code, 200)
+        favorite_url = reverse("routes:toggle_favorite", args=[route.pk])
+        for _ in range(2):
+            self.assertEqual(self.client.post(favorite_url).status_code, 200)
+
+    def test_over_budget_raises_when_strict(self):
+        with mock.patch.dict(instrumentation.BUDGETS, {"routes:list": 0}):
+            with self.assertRaises(instrumentation.QueryBudgetExceeded):
+                self.client.get(reverse("routes:list"))
+
+
+class QueryPlanTests(TestCase):
+    """The hot queries keep using their indexes (see `manage.py check_query_plans`)."""
+
+    def test_hot_queries_use_their_indexes(self):
+        for label, queryset, index in hot_queries(User(pk=1)):
+            with self.subTest(label):
+                plan = queryset.explain()
+                self.assertIn(index, plan)
+                self.assertIsNone(_FULL_SCAN_RE.search(plan), plan)
+
+    def test_full_scan_pattern(self):
+        self.assertTrue(_FULL_SCAN_RE.search("2 0 0 SCAN routes_route"))
+        self.assertIsNone(_FULL_SCAN_RE.search("2 0 0 SCAN routes_route USING INDEX route_title_ci_id_idx"))
+        self.assertIsNone(_FULL_SCAN_RE.search("2 0 0 SEARCH routes_route USING INDEX route_lat_lng_idx (latitude>?)"))
+
+    def test_command_passes(self):
+        out = StringIO()
+        call_command("check_query_plans", stdout=out)
+        self.assertIn("All hot queries use their indexes.", out.getvalue())
+
+
+class RouteSearchTests(TestCase):
+    """Filters apply before the full-text result cap, not after it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("climber", password="x")
+        Route.objects.bulk_create([
+            Route(
+                author=cls.user, title=f"Crack {i}", description="Hand crack", difficulty=1,
+                latitude=40.0, longitude=-105.0, geocell=grid_cell(40.0, -105.0),
+            )
+            for i in range(search.MAX_RESULTS + 10)
+        ])
+        # Weakest text match (description only), so it ranks below every easy route
+        cls.hard = Route.objects.create(
+            author=cls.user, title="Roof", description="A crack through the roof", difficulty=9,
+            latitude=40.0, longitude=-105.0,
+        )
+        search.rebuild()  # bulk_create skips the receivers (geocell, search index)
+
+    def _results(self, **params):
+        response = self.client.get(reverse("routes:search"), {"q": "crack", **params})
+        return [route.pk for route in response.context["routes"]]
+
+    def test_difficulty_filter_reaches_past_the_cap(self):
+        self.assertEqual(self._results(difficulty_min=9), [self.hard.pk])
+
+    def test_radius_search_reaches_past_the_cap(self):
+        self.assertEqual(self._results(difficulty_min=9, lat=40.0, lng=-105.0), [self.hard.pk])
+
+    def test_results_are_capped(self):
+        self.assertEqual(len(self._results()), search.MAX_RESULTS)
+        self.assertEqual(len(self._results(lat=40.0, lng=-105.0)), search.MAX_RESULTS)
+
+
+class TypeaheadTests(TestCase):
+    """Suggestions are the best-voted matches among all routes, not the first keys in order."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("climber", password="x")
+        Route.objects.bulk_create([
+            Route(author=cls.user, title=f"Crack {i:04d}", description="d", difficulty=3)
+            for i in range(5100)
+        ])
+        # Sorts after every "crack ..." key
+        cls.crux = Route.objects.create(author=cls.user, title="Crux", description="d", difficulty=3, upvotes=10)
+
+    def setUp(self):
+        _clear_caches()
+        self.index = typeahead.PrefixIndex()
+
+    def test_common_prefix_ranks_every_match(self):
+        self.assertEqual(self.index.suggest("cr", 1)[0]["id"], self.crux.pk)
+
+    def test_score_changes_reach_memoized_results(self):
+        self.assertEqual(self.index.suggest("cr", 1)[0]["id"], self.crux.pk)
+        self.index.update_score(self.crux.pk, -1)
+        self.assertNotEqual(self.index.suggest("cr", 1)[0]["id"], self.crux.pk)
+
+    def test_saved_route_appears_on_commit(self):
+        self.index.suggest("cr")
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch.object(typeahead, "index", self.index):
+                route = Route.objects.create(author=self.user, title="Crimp", description="d", difficulty=3, upvotes=50)
+        self.assertEqual(self.index.suggest("cr", 1)[0]["id"], route.pk)
+
+
+class GeocodeConcurrencyTests(TestCase):
+    """Concurrent searches share in-flight lookups, the backlog is bounded and requests are spaced."""
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.looked_up = []
+
+        def slow_lookup(key, location_text):
+            self.release.wait(5)
+            self.looked_up.append(key)
+            return (40.0, -105.0)
+
+        patcher = mock.patch.object(geocoding, "_threaded_lookup", slow_lookup)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self._drain)
+
+    def _drain(self):
+        self.release.set()
+        with geocoding._in_flight_lock:
+            futures = list(geocoding._in_flight.values())
+        for future in futures:
+            future.result(5)
+
+    def test_same_key_is_looked_up_once(self):
+        for _ in range(3):
+            self.assertEqual(geocoding.geocode_many(["Boulder, CO"], allow_network=True, budget=0), {})
+        self._drain()
+        self.assertEqual(self.looked_up, ["boulder, co"])
+
+    def test_backlog_is_bounded(self):
+        with mock.patch.object(geocoding, "MAX_PENDING", 2):
+            geocoding.geocode_many(["Boulder", "Golden", "Estes Park"], allow_network=True, budget=0)
+            self._drain()
+        self.assertEqual(sorted(self.looked_up), ["boulder", "golden"])
+
+    @mock.patch.object(geocoding, "REQUESTS_PER_SECOND", 2.0)
+    def test_network_calls_are_spaced(self):
+        with mock.patch.object(geocoding, "_next_request_at", 0.0), \
+                mock.patch.object(geocoding.time, "monotonic", return_value=100.0), \
+                mock.patch.object(geocoding.time, "sleep") as sleep:
+            for _ in range(3):
+                geocoding._wait_for_slot()
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [0.5, 1.0])
+
+
+class BackfillRouteCoordsTests(TestCase):
+    def test_backfilled_detail_pages_are_not_served_stale(self):
+        user = User.objects.create_user("climber", password="x")
+        route = Route.objects.create(
+            author=user, title="Flatiron", description="d", difficulty=3, location_name="Boulder, CO",
+        )
+        GeocodeCacheEntry.objects.create(
+            key="boulder, co", latitude=40.0, longitude=-105.3,
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+        self.client.force_login(user)
+        url = reverse("routes:detail", args=[route.pk])
+        etag = self.client.get(url)["ETag"]
+        updated_at = Route.objects.get(pk=route.pk).updated_at
+
+        call_command("backfill_route_coords", stdout=StringIO())
+
+        route.refresh_from_db()
+        self.assertEqual((route.latitude, route.longitude), (40.0, -105.3))
+        self.assertGreater(route.updated_at, updated_at)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["route"].latitude, 40.0)
+
+
+class BulkInteractionTests(TestCase):
+    """Last-write-wins application of queued votes and favorites."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("climber", password="x")
+        cls.route = Route.objects.create(author=cls.user, title="Arete", description="d", difficulty=3)
+
+    def _apply(self, *operations):
+        return interactions.apply_operations(self.user, list(operations))
+
+    def _op(self, action, at, route=None):
+        return {"route": route or self.route.pk, "action": action, "at": at}
+
+    def _counters(self):
+        return Route.objects.values_list("upvotes", "downvotes", "favorites_count").get(pk=self.route.pk)
+
+    def test_latest_operation_in_batch_wins(self):
+        results, routes = self._apply(
+            self._op("upvote", "2026-01-01T10:00:00Z"),
+            self._op("downvote", "2026-01-01T11:00:00Z"),
+            self._op("favorite", "2026-01-01T09:00:00Z"),
+        )
+        self.assertEqual([r["status"] for r in results], ["superseded", "applied", "applied"])
+        self.assertEqual(self._counters(), (0, 1, 1))
+        self.assertEqual(routes[self.route.pk]["user_vote"], False)
+        self.assertTrue(routes[self.route.pk]["is_favorited"])
+
+    def test_ties_go_to_the_later_operation(self):
+        results, _ = self._apply(
+            self._op("upvote", "2026-01-01T10:00:00Z"),
+            self._op("downvote", "2026-01-01T10:00:00Z"),
+        )
+        self.assertEqual([r["status"] for r in results], ["superseded", "applied"])
+        self.assertFalse(Vote.objects.get(user=self.user).is_upvote)
+
+    def test_older_operation_than_stored_state_is_stale(self):
+        self._apply(self._op("upvote", "2026-01-01T10:00:00Z"), self._op("favorite", "2026-01-01T10:00:00Z"))
+        results, _ = self._apply(
+            self._op("downvote", "2026-01-01T09:00:00Z"),
+            self._op("unfavorite", "2026-01-01T09:00:00Z"),
+        )
+        self.assertEqual([r["status"] for r in results], ["stale", "stale"])
+        self.assertEqual(self._counters(), (1, 0, 1))
+
+    def test_repeating_the_stored_state_is_unchanged(self):
+        self._apply(self._op("upvote", "2026-01-01T10:00:00Z"))
+        results, _ = self._apply(self._op("upvote", "2026-01-01T11:00:00Z"))
+        self.assertEqual(results[0]["status"], "unchanged")
+        self.assertEqual(self._counters(), (1, 0, 0))
+
+    def test_removals_adjust_counters(self):
+        self._apply(self._op("upvote", "2026-01-01T10:00:00Z"), self._op("favorite", "2026-01-01T10:00:00Z"))
+        results, routes = self._apply(
+            self._op("unvote", "2026-01-01T11:00:00Z"),
+            self._op("unfavorite", "2026-01-01T11:00:00Z"),
+        )
+        self.assertEqual([r["status"] for r in results], ["applied", "applied"])
+        self.assertEqual(self._counters(), (0, 0, 0))
+        self.assertIsNone(routes[self.route.pk]["user_vote"])
+        self.assertFalse(Vote.objects.filter(user=self.user).exists())
+        self.assertFalse(Favorite.objects.filter(user=self.user).exists())
+
+    def test_future_timestamps_are_clamped_to_now(self):
+        self._apply(self._op("upvote", "2999-01-01T00:00:00Z"))
+        self.assertLessEqual(Vote.objects.get(user=self.user).updated_at, timezone.now())
+        # So a later real-time change still wins
+        results, _ = self._apply(self._op("downvote", timezone.now().isoformat()))
+        self.assertEqual(results[0]["status"], "applied")
+
+    def test_missing_routes_and_bad_operations_are_per_item_errors(self):
+        results, routes = self._apply(
+            self._op("upvote", "2026-01-01T10:00:00Z", route=999999),
+            self._op("upvote", "2026-02-30T10:00:00Z"),
+            {"route": self.route.pk, "action": "boo", "at": "2026-01-01T10:00:00Z"},
+            "nope",
+            self._op("favorite", "2026-01-01T10:00:00Z"),
+        )
+        self.assertEqual(
+            [(r["status"], r.get("error")) for r in results],
+            [
+                ("error", "No such route."),
+                ("error", "at must be an ISO 8601 timestamp."),
+                ("error", "action must be one of: upvote, downvote, unvote, favorite, unfavorite."),
+                ("error", "Each operation must be an object."),
+                ("applied", None),
+            ],
+        )
+        self.assertEqual(list(routes), [self.route.pk])
+        self.assertEqual(self._counters(), (0, 0, 1))
+
+
+class MediaTestCase(TestCase):
+    """Runs with MEDIA_ROOT in a throwaway directory and image jobs left queued."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        queued = mock.patch.object(jobs, "MODE", "queue")
+        queued.start()
+        self.addCleanup(queued.stop)
+        self.storage = route_image_storage()
+
+    @staticmethod
+    def png(color="red", name="photo.png"):
+        buf = BytesIO()
+        Image.new("RGB", (40, 30), color).save(buf, "PNG")
+        return SimpleUploadedFile(name, buf.getvalue(), content_type="image/png")
+
+    def age(self, name, seconds):
+        path = self.storage.path(name)
+        past = time.time() - seconds
+        os.utime(path, (past, past))
+
+
+class ContentAddressedImageTests(MediaTestCase):
+    """Shared originals are reference counted by rows and only collected after a grace period."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("climber", password="x")
+        cls.route = Route.objects.create(author=cls.user, title="Slab", description="d", difficulty=3)
+
+    def _image(self, color="red"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return RouteImage.objects.create(route=self.route, image=self.png(color))
+
+    def _delete(self, route_image):
+        with self.captureOnCommitCallbacks(execute=True):
+            route_image.delete()
+
+    def test_identical_uploads_share_one_file(self):
+        first, second = self._image(), self._image()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith(CAS_PREFIX))
+        self.assertNotEqual(first.image.name, self._image("blue").image.name)
+
+    def test_file_is_kept_while_referenced(self):
+        first, second = self._image(), self._image()
+        name = first.image.name
+        self.age(name, images.ORPHAN_GRACE_SECONDS + 60)
+        self._delete(first)
+        self.assertTrue(self.storage.exists(name))
+        self._delete(second)
+        self.assertFalse(self.storage.exists(name))
+
+    def test_recent_orphans_survive_until_the_grace_period_ends(self):
+        route_image = self._image()
+        name = route_image.image.name
+        self._delete(route_image)
+        self.assertTrue(self.storage.exists(name))
+        self.assertFalse(images.release_original(name, self.storage))
+        self.age(name, images.ORPHAN_GRACE_SECONDS + 60)
+        self.assertTrue(images.release_original(name, self.storage))
+        self.assertFalse(self.storage.exists(name))
+
+    def test_reusing_a_stored_file_refreshes_its_mtime(self):
+        name = self._image().image.name
+        self.age(name, images.ORPHAN_GRACE_SECONDS + 60)
+        self.assertFalse(images.recently_written(name, self.storage))
+        self._image()
+        self.assertTrue(images.recently_written(name, self.storage))
+
+    def test_legacy_uploads_are_never_released(self):
+        self.assertFalse(images.release_original("routes/pictures/old.jpg", self.storage))
+
+    def test_gc_deletes_only_old_orphans(self):
+        kept = self._image().image.name
+        fresh = self.storage.save("x.png", self.png("green"))
+        stale = self.storage.save("y.png", self.png("blue"))
+        for name in (kept, stale):
+            self.age(name, images.ORPHAN_GRACE_SECONDS + 60)
+
+        call_command("gc_route_images", stdout=StringIO())
+
+        self.assertTrue(self.storage.exists(kept))
+        self.assertTrue(self.storage.exists(fresh))
+        self.assertFalse(self.storage.exists(stale))
+
+
+class RouteImageUploadTests(MediaTestCase):
+    """The streaming upload handler's size limits and type sniffing."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("climber", password="x")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def _create(self, *files):
+        return self.client.post(reverse("routes:add"), {
+            "title": "New line", "description": "d", "difficulty": 3,
+            "latitude": "40", "longitude": "-105", "images": list(files),
+        })
+
+    def _errors(self, response):
+        return response.context["form"].errors.get("images", [])
+
+    def test_type_is_sniffed_from_content_not_name(self):
+        response = self._create(self.png(name="holiday.jpg"))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(RouteImage.objects.get().image.name.endswith(".png"))
+
+    def test_non_images_are_rejected(self):
+        response = self._create(SimpleUploadedFile("notes.jpg", b"just some text, not a photo"))
+        self.assertIn("notes.jpg is not a JPEG, PNG, GIF or WebP image.", self._errors(response))
+        self.assertFalse(Route.objects.exists())
+
+    def test_files_over_the_per_file_limit_are_rejected(self):
+        with mock.patch.object(uploads, "MAX_FILE_BYTES", 50):
+            response = self._create(self.png(name="big.png"))
+        self.assertIn("big.png is larger than 50\xa0bytes.", self._errors(response))
+        self.assertFalse(Route.objects.exists())
+
+    def test_requests_over_the_total_limit_are_rejected(self):
+        size = len(self.png().read())
+        with mock.patch.object(uploads, "MAX_REQUEST_BYTES", size + size // 2):
+            response = self._create(self.png("red", "a.png"), self.png("blue", "b.png"))
+        self.assertTrue(any("per request" in message for message in self._errors(response)))
+        self.assertFalse(Route.objects.exists())
+        self.assertEqual(os.listdir(self.storage.path(UPLOAD_TMP_DIR)), [])
+
+
+class GeocodeCacheTests(TestCase):
+    """Negative caching, TTLs and eviction of the shared geocode cache."""
+
+    def test_misses_are_cached_with_the_negative_ttl(self):
+        with mock.patch.object(geocoding, "_fetch_nominatim", return_value=None) as fetch:
+            self.assertIsNone(geocoding.geocode_first("Nowhere Crag"))
+            self.assertIsNone(geocoding.geocode_first("nowhere  crag"))
+        fetch.assert_called_once()
+        entry = GeocodeCacheEntry.objects.get(key="nowhere crag")
+        self.assertIsNone(entry.latitude)
+        self.assertAlmostEqual(
+            (entry.expires_at - timezone.now()).total_seconds(),
+            geocoding.NEGATIVE_TTL.total_seconds(), delta=60,
+        )
+
+    def test_hits_are_cached_with_the_positive_ttl(self):
+        with mock.patch.object(geocoding, "_fetch_nominatim", return_value=(40.0, -105.3)):
+            self.assertEqual(geocoding.geocode_first("Boulder, CO"), (40.0, -105.3))
+        entry = GeocodeCacheEntry.objects.get(key="boulder, co")
+        self.assertGreater(entry.expires_at - timezone.now(), geocoding.NEGATIVE_TTL)
+        self.assertEqual(geocoding.cache_get("boulder, co"), (True, (40.0, -105.3)))
+
+    def test_expired_entries_are_looked_up_again(self):
+        GeocodeCacheEntry.objects.create(key="golden", latitude=None, longitude=None,
+                                         expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(geocoding.cache_get("golden"), (False, None))
+        with mock.patch.object(geocoding, "_fetch_nominatim", return_value=(39.7, -105.2)) as fetch:
+            self.assertEqual(geocoding.geocode_first("Golden"), (39.7, -105.2))
+        fetch.assert_called_once()
+
+    def test_transport_errors_are_not_cached(self):
+        with mock.patch.object(geocoding, "_fetch_nominatim", side_effect=OSError("down")):
+            self.assertIsNone(geocoding.geocode_first("Estes Park"))
+        self.assertFalse(GeocodeCacheEntry.objects.exists())
+
+    def test_eviction_drops_expired_then_soonest_to_expire(self):
+        now = timezone.now()
+        GeocodeCacheEntry.objects.create(key="expired", expires_at=now - timedelta(hours=1))
+        for i in range(4):
+            GeocodeCacheEntry.objects.create(key=f"k{i}", latitude=1.0, longitude=1.0,
+                                             expires_at=now + timedelta(days=i + 1))
+        self.assertEqual(geocoding.evict(max_entries=2), 3)
+        self.assertEqual(sorted(GeocodeCacheEntry.objects.values_list("key", flat=True)), ["k2", "k3"])
+
+
+class EmbedTests(TestCase):
+    def test_youtube_ids(self):
+        for url, expected in (
+            ("https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42", "dQw4w9WgXcQ"),
+            ("https://youtu.be/dQw4w9WgXcQ", "dQw4w9WgXcQ"),
+            ("https://m.youtube.com/shorts/dQw4w9WgXcQ?feature=share", "dQw4w9WgXcQ"),
+            ("https://youtu.be/abc", ""),
+            # Longer than Route.youtube_id can store: not an id, and never truncated into one
+            ("https://youtu.be/" + "a" * 33, ""),
+            ("https://example.com/watch?v=dQw4w9WgXcQ", ""),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(embeds.parse_youtube_id(url), expected)
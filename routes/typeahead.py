@@ -0,0 +1,200 @@
+"""
+In-memory prefix index for search-box suggestions.
+
+Every route contributes a few sorted keys: its whole title and location, and
+each word in them, normalized (casefolded, accents stripped). A prefix lookup
+is two bisects into that sorted list, then the top-k matching routes by net
+votes over every match, with no database query at all. The top results per
+prefix are memoized until the index next changes, so a very common prefix
+("cr", "th") costs a full ranking only once.
+
+The index is built lazily per process. In the process that handles a write,
+the Route post_save/post_delete receivers update it incrementally, on commit
+(so rolled-back routes never show up), and vote views push score changes with
+update_score(). Every other process only learns that *something* changed:
+the receivers bump a version counter in the shared cache
+(ROUTE_TYPEAHEAD_CACHE_ALIAS), and a process whose copy is behind reloads the
+whole table on its next lookup. With several workers, each route save thus
+costs every other worker one full reload. REBUILD_AFTER is a safety net for
+anything else (bulk .update() calls, raw SQL).
+"""
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+MIN_PREFIX = 2
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+# Prefixes whose ranked results are kept between lookups (cleared on any change)
+MAX_MEMOIZED = 2048
+REBUILD_AFTER = getattr(settings, "ROUTE_TYPEAHEAD_REBUILD_SECONDS", 15 * 60)
+
+_VERSION_KEY = "route-typeahead:version"
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _cache():
+    return caches[getattr(settings, "ROUTE_TYPEAHEAD_CACHE_ALIAS", "default")]
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.casefold().split())
+
+
+def keys_for(title: str, location: str) -> set[str]:
+    keys = set()
+    for value in (title, location):
+        value = normalize(value)
+        if not value:
+            continue
+        keys.add(value)
+        keys.update(_WORD_RE.findall(value))
+    return keys
+
+
+class PrefixIndex:
+    """Sorted (key, route_id) pairs plus the display data for each route."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = []   # sorted list of (key, route_id)
+        self._routes = {}    # route_id -> {"title", "location", "score", "keys"}
+        self._built_at = None
+        self._version = None
+        self._top = {}       # prefix -> up to MAX_LIMIT route ids, best first
+
+    # ---- building ----
+    def _load(self):
+        from .models import Route
+
+        entries, routes = [], {}
+        rows = Route.objects.values_list("id", "title", "location_name", "upvotes", "downvotes")
+        for pk, title, location, up, down in rows.iterator(chunk_size=2000):
+            keys = keys_for(title, location)
+            routes[pk] = {"title": title, "location": location or "", "score": up - down, "keys": keys}
+            entries.extend((key, pk) for key in keys)
+        entries.sort()
+        return entries, routes
+
+    def _ensure_fresh(self):
+        version = _cache().get(_VERSION_KEY, 0)
+        stale = (
+            self._built_at is None
+            or version != self._version
+            or time.monotonic() - self._built_at > REBUILD_AFTER
+        )
+        if not stale:
+            return
+        entries, routes = self._load()
+        with self._lock:
+            self._entries, self._routes = entries, routes
+            self._top = {}
+            self._built_at = time.monotonic()
+            self._version = version
+
+    def _bump_version(self):
+        """Tell other processes their copy is stale; keep ours in step if we were current."""
+        cache = _cache()
+        try:
+            version = cache.incr(_VERSION_KEY)
+        except ValueError:
+            cache.add(_VERSION_KEY, 1, timeout=None)
+            version = cache.get(_VERSION_KEY, 1)
+        with self._lock:
+            if self._version is not None and version == self._version + 1:
+                self._version = version
+
+    # ---- incremental updates ----
+    def _remove_locked(self, pk):
+        info = self._routes.pop(pk, None)
+        if not info:
+            return
+        for key in info["keys"]:
+            i = bisect_left(self._entries, (key, pk))
+            if i < len(self._entries) and self._entries[i] == (key, pk):
+                del self._entries[i]
+
+    def upsert(self, route):
+        """Index the route's current text once the surrounding transaction commits."""
+        pk, title, location = route.pk, route.title, route.location_name or ""
+        score = route.upvotes - route.downvotes
+        transaction.on_commit(lambda: self._upsert(pk, title, location, score))
+
+    def _upsert(self, pk, title, location, score):
+        if self._built_at is not None:
+            keys = keys_for(title, location)
+            with self._lock:
+                self._remove_locked(pk)
+                self._top = {}
+                self._routes[pk] = {"title": title, "location": location, "score": score, "keys": keys}
+                for key in keys:
+                    insort(self._entries, (key, pk))
+        self._bump_version()
+
+    def remove(self, pk):
+        """Drop the route once the surrounding transaction commits."""
+        transaction.on_commit(lambda: self._remove(pk))
+
+    def _remove(self, pk):
+        if self._built_at is not None:
+            with self._lock:
+                self._remove_locked(pk)
+                self._top = {}
+        self._bump_version()
+
+    def update_score(self, pk, score):
+        """Votes only change the ranking, so no version bump (other copies catch up on rebuild)."""
+        with self._lock:
+            info = self._routes.get(pk)
+            if info and info["score"] != score:
+                info["score"] = score
+                self._top = {}
+
+    # ---- lookups ----
+    def _rank_locked(self, prefix):
+        """Top MAX_LIMIT ids among all routes with a key starting with `prefix`."""
+        entries, routes = self._entries, self._routes
+        start = bisect_left(entries, (prefix,))
+        end = bisect_left(entries, (prefix + "\U0010ffff",), start)
+        matched = {pk for _, pk in entries[start:end]}
+        return heapq.nlargest(MAX_LIMIT, matched, key=lambda pk: (routes[pk]["score"], -pk))
+
+    def suggest(self, prefix: str, limit: int = DEFAULT_LIMIT) -> list[dict]:
+        prefix = normalize(prefix)
+        if len(prefix) < MIN_PREFIX:
+            return []
+        self._ensure_fresh()
+        with self._lock:
+            routes = self._routes
+            best = self._top.get(prefix)
+            if best is None:
+                best = self._rank_locked(prefix)
+                if len(self._top) >= MAX_MEMOIZED:
+                    self._top = {}
+                self._top[prefix] = best
+            best = best[:limit]
+            return [
+                {"id": pk, "title": routes[pk]["title"], "location": routes[pk]["location"],
+                 "net_votes": routes[pk]["score"]}
+                for pk in best
+            ]
+
+
+index = PrefixIndex()
+
+
+def suggest(prefix: str, limit: int = DEFAULT_LIMIT) -> list[dict]:
+    return index.suggest(prefix, max(1, min(limit, MAX_LIMIT)))
+
+
+def update_score(pk, score) -> None:
+    index.update_score(pk, score)
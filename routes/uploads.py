@@ -0,0 +1,164 @@
+"""
+Streaming upload handling for route photos.
+
+RouteImageUploadHandler replaces Django's memory/temp-file handlers on the
+route create/edit views. While the multipart body is being read it:
+
+- rejects a file as soon as its first bytes don't look like JPEG/PNG/GIF/WebP,
+- stops writing a file once it passes ROUTE_IMAGE_MAX_BYTES and skips every
+  file once the request passes ROUTE_UPLOAD_MAX_BYTES,
+- hashes each file as it arrives and spools it into a temp dir inside
+  MEDIA_ROOT, so saving it later is a rename into content-addressed storage
+  (routes.storage) with no second read or copy.
+
+Rejected files never reach request.FILES; their messages are collected in
+request.upload_errors for the form to show.
+"""
+import hashlib
+import os
+import tempfile
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopFutureHandlers
+from django.template.defaultfilters import filesizeformat
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+from .storage import UPLOAD_TMP_DIR, route_image_storage
+
+MAX_FILE_BYTES = getattr(settings, "ROUTE_IMAGE_MAX_BYTES", 15 * 2**20)
+MAX_REQUEST_BYTES = getattr(settings, "ROUTE_UPLOAD_MAX_BYTES", 60 * 2**20)
+
+_SNIFF_BYTES = 12
+
+
+def sniff_image_ext(head: bytes) -> str | None:
+    """Extension for the image format the leading bytes belong to, or None."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return ".gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+class StreamedImageUpload(TemporaryUploadedFile):
+    """A TemporaryUploadedFile spooled next to the media files, with its SHA-256."""
+
+    def __init__(self, name, content_type, charset, content_type_extra=None):
+        tmp_dir = route_image_storage().path(UPLOAD_TMP_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        file = tempfile.NamedTemporaryFile(suffix=".upload", dir=tmp_dir)
+        UploadedFile.__init__(self, file, name, content_type, 0, charset, content_type_extra)
+        self.sha256 = None
+
+
+class RouteImageUploadHandler(FileUploadHandler):
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.errors = []
+        self.received = 0
+        self.over_request_limit = False
+        if request is not None:
+            request.upload_errors = self.errors
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Content-Length counts form fields too, but anything this far over can't pass
+        if content_length and content_length > MAX_REQUEST_BYTES + 2**20:
+            self.over_request_limit = True
+            self.errors.append(
+                f"The upload is too large ({filesizeformat(content_length)}); "
+                f"the limit is {filesizeformat(MAX_REQUEST_BYTES)} per request."
+            )
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        # The previous file (if any) belongs to request.FILES now; just let go of it
+        self.__dict__.pop("file", None)
+        if self.over_request_limit:
+            raise SkipFile()
+        if self.content_length and self.content_length > MAX_FILE_BYTES:
+            self._reject(self._too_large())
+        self.head = b""
+        self.ext = None
+        self.digest = hashlib.sha256()
+        self.file = StreamedImageUpload(
+            self.file_name, self.content_type, self.charset, self.content_type_extra
+        )
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        end = start + len(raw_data)
+        if end > MAX_FILE_BYTES:
+            self._reject(self._too_large())
+        if self.received + len(raw_data) > MAX_REQUEST_BYTES:
+            self.over_request_limit = True
+            self._reject(f"Uploads are limited to {filesizeformat(MAX_REQUEST_BYTES)} per request.")
+        if self.ext is None:
+            self.head += raw_data[:_SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= _SNIFF_BYTES:
+                self._check_type()
+
+        self.received += len(raw_data)
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not hasattr(self, "file"):
+            return None
+        if self.ext is None:
+            try:
+                self._check_type()  # files shorter than the sniff window
+            except SkipFile:
+                return None
+        stem = os.path.splitext(self.file_name or "upload")[0]
+        self.file.name = f"{stem}{self.ext}"
+        self.file.size = file_size
+        self.file.sha256 = self.digest.hexdigest()
+        self.file.seek(0)
+        return self.file
+
+    def upload_interrupted(self):
+        self._discard()
+
+    # ---- helpers ----
+    def _check_type(self):
+        self.ext = sniff_image_ext(self.head)
+        if self.ext is None:
+            self._reject(f"{self.file_name} is not a JPEG, PNG, GIF or WebP image.")
+
+    def _too_large(self):
+        return f"{self.file_name} is larger than {filesizeformat(MAX_FILE_BYTES)}."
+
+    def _reject(self, message):
+        self.errors.append(message)
+        self._discard()
+        raise SkipFile()
+
+    def _discard(self):
+        # Drop the attribute too: the parser closes any `handler.file` after SkipFile
+        file = self.__dict__.pop("file", None)
+        if file is not None:
+            file.close()  # NamedTemporaryFile removes itself on close
+
+
+def streaming_image_uploads(view):
+    """
+    View decorator installing RouteImageUploadHandler. Handlers must be set
+    before anything reads request.POST, which CsrfViewMiddleware would do,
+    so the CSRF check moves inside (the pattern from Django's upload docs).
+    """
+    protected = csrf_protect(view)
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        request.upload_handlers = [RouteImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+
+    return csrf_exempt(wrapped)
@@ -6,6 +6,8 @@ app_name = "routes"
 
 urlpatterns = [
     path("search/", views.route_search, name="search"),
+    path("map/", views.route_map_data, name="map_data"),
+    path("suggest/", views.route_suggest, name="suggest"),
 
     path("add/", views.route_create, name="add"),
     path("<int:pk>/edit/", views.route_edit, name="edit"),
@@ -19,4 +21,5 @@ urlpatterns = [
     # AJAX endpoints for favorites and votes
     path("<int:pk>/favorite/", views.toggle_favorite, name="toggle_favorite"),
     path("<int:pk>/vote/", views.vote_route, name="vote"),
+    path("interactions/", views.bulk_interactions, name="bulk_interactions"),
 ]
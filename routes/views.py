@@ -1,25 +1,33 @@
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, render, redirect
-from django.http import JsonResponse
+from django.urls import reverse
+from django.http import Http404, JsonResponse
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Lower
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.utils.text import Truncator
 from django.views.decorators.http import require_POST
-from django.views.decorators.csrf import csrf_exempt
 
-from .forms import RouteForm
-from .models import Route, RouteImage, Favorite, Vote
+from . import clustering, conditional, db_routing, gallery, interactions, page_cache, search, typeahead
+from .forms import RouteForm, RouteImagesEditForm
+from .geo import bounding_box, cells_for_bbox, haversine_miles
+from .geocoding import geocode_many, normalize_location
+from .models import Route, Favorite, Vote
+from .pagination import KeysetPaginationMixin, keyset_paginate
+from .uploads import streaming_image_uploads
 
-import os
-import re
+import json
 import math
-import requests
-import unicodedata
-from functools import lru_cache
 
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView
 from .models import Route
 
-class MyRoutesView(LoginRequiredMixin, ListView):
+class MyRoutesView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     template_name = "routes/my_routes.html"
     context_object_name = "routes"
     login_url = "login"
@@ -59,7 +67,7 @@ class MyRoutesView(LoginRequiredMixin, ListView):
         return qs.none()
 
 
-class MyFavoriteRoutesView(LoginRequiredMixin, ListView):
+class MyFavoriteRoutesView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """
     Shows all routes that the current user has favorited.
     """
@@ -72,47 +80,32 @@ class MyFavoriteRoutesView(LoginRequiredMixin, ListView):
         user = self.request.user
         return (
             Route.objects
-            .filter(favorites__user=user)
+            .filter(favorites__user=user)  # (user, route) is unique, so no .distinct()
             .select_related("author")
             .prefetch_related("images")  # keep similar to route_list
-            .distinct()
             .order_by("-id")
         )
 
-def _slugify_simple(value: str, allow_unicode: bool = False) -> str:
-    """
-    Lightweight slugify: lowercase, spaces -> '-', remove anything not alnum, dash, or underscore.
-    """
-    value = str(value)
-    if allow_unicode:
-        value = unicodedata.normalize("NFKC", value)
-    else:
-        value = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode("ascii")
-    value = re.sub(r"[^\w\s-]", "", value.lower())
-    value = re.sub(r"[\s-]+", "-", value).strip("-")
-    return value or "untitled"
-
-
-def _normalized_ext(original_name: str) -> str:
-    """
-    Lowercase extension; fall back to .jpg if missing/unknown.
-    """
-    ext = os.path.splitext(original_name)[1].lower()
-    if ext in {".jpg", ".jpeg"}: return ".jpg"
-    if ext in {".png"}: return ".png"
-    if ext in {".webp"}: return ".webp"
-    if ext in {".gif"}: return ".gif"
-    return ".jpg"
-
-
+@db_routing.replica_reads
+@page_cache.cached_page(lambda request: [page_cache.CATALOG])
 def route_list(request):
-    routes = Route.objects.select_related("author").prefetch_related("images")
-    return render(request, "routes/route_list.html", {"routes": routes})
+    # Keyset pagination on the default (lower(title), id) ordering
+    routes = (
+        Route.objects
+        .annotate(title_ci=Lower("title"))
+        .select_related("author")
+        .prefetch_related("images")
+    )
+    page = keyset_paginate(routes, [("title_ci", False), ("id", False)], request.GET.get("cursor"))
+    return render(request, "routes/route_list.html", {"routes": page.object_list, "page_obj": page})
 
 
+@db_routing.replica_reads
+@conditional.conditional_page(conditional.route_detail_etag, conditional.route_detail_last_modified)
+@page_cache.cached_page(lambda request, pk: [page_cache.route_scope(pk)])
 def route_detail(request, pk: int):
     route = get_object_or_404(
-        Route.objects.select_related("author").prefetch_related("images", "favorites", "votes"),
+        Route.objects.select_related("author").prefetch_related("images"),
         pk=pk
     )
     
@@ -129,10 +122,12 @@ def route_detail(request, pk: int):
 
 
 @login_required
+@streaming_image_uploads
 def route_create(request):
     if request.method == "POST":
         # Include POST data and files
-        form = RouteForm(request.POST, request.FILES, user=request.user, is_edit=False)
+        form = RouteForm(request.POST, request.FILES, user=request.user, is_edit=False,
+                         upload_errors=request.upload_errors)
 
         if form.is_valid():
             files = form.cleaned_data.get("images") or []
@@ -142,14 +137,7 @@ def route_create(request):
             route.author = request.user
             route.save()
 
-            user_slug = _slugify_simple(request.user.username or "user")
-            title_slug = _slugify_simple(route.title or "route")
-
-            for idx, f in enumerate(files, start=1):
-                ext = _normalized_ext(getattr(f, "name", "") or "")
-                new_name = f"{user_slug}_{title_slug}_{idx}{ext}"
-                f.name = new_name
-                RouteImage.objects.create(route=route, image=f, order=idx)
+            gallery.add_images(route, files)
 
             messages.success(request, "Route added successfully!")
             return redirect("routes:detail", pk=route.pk)
@@ -192,6 +180,7 @@ def route_delete(request, pk: int):
 
 
 @login_required
+@streaming_image_uploads
 def route_edit(request, pk: int):
     """Edit an existing route (only by author)"""
     route = get_object_or_404(
@@ -205,34 +194,34 @@ def route_edit(request, pk: int):
         return redirect("routes:detail", pk=route.pk)
     
     if request.method == "POST":
-        form = RouteForm(request.POST, request.FILES, instance=route, user=request.user, is_edit=True)  # Add is_edit=True
+        form = RouteForm(request.POST, request.FILES, instance=route, user=request.user, is_edit=True,
+                         upload_errors=request.upload_errors)
+        files = request.FILES.getlist("images")
+        image_form = RouteImagesEditForm(request.POST, request.FILES, route=route, adding=len(files))
 
-        if form.is_valid():
+        if form.is_valid() and image_form.is_valid():
             # Get new images (if any)
             files = form.cleaned_data.get("images") or []
-            
-            # Save route updates
-            route = form.save(commit=True)
-            
-            # Handle new images
-            if files:
-                # Delete old images and replace with new ones
-                route.images.all().delete()
-                
-                user_slug = _slugify_simple(request.user.username or "user")
-                title_slug = _slugify_simple(route.title or "route")
-                
-                for idx, f in enumerate(files, start=1):
-                    ext = _normalized_ext(getattr(f, "name", "") or "")
-                    new_name = f"{user_slug}_{title_slug}_{idx}{ext}"
-                    f.name = new_name
-                    RouteImage.objects.create(route=route, image=f, order=idx)
-            
+
+            # Geocoding (network) and file writes happen before the transaction,
+            # which holds SQLite's write lock from BEGIN until COMMIT
+            route = form.save(commit=False)
+            edits = image_form.edits()
+            files = [gallery.store_upload(f) for f in files]
+            edits["replace"] = {pk: gallery.store_upload(f) for pk, f in edits["replace"].items()}
+
+            with transaction.atomic():
+                route.save()
+                form.save_m2m()
+                # Only the images that were removed, replaced, moved or added are touched
+                gallery.apply_image_edits(route, add=files, **edits)
+
             messages.success(request, "Route updated successfully!")
             return redirect("routes:detail", pk=route.pk)
         # fall through to show form with errors
     else:
         form = RouteForm(instance=route, user=request.user, is_edit=True)  # Add is_edit=True
+        image_form = RouteImagesEditForm(route=route)
 
     # Get user's location from their profile if available
     user_location = None
@@ -246,49 +235,23 @@ def route_edit(request, pk: int):
         "form": form,
         "user_location": user_location,
         "route": route,
+        "image_form": image_form,
         "is_edit": True
     }
     
     return render(request, "routes/route_form.html", context)
 
-@lru_cache(maxsize=512)
-def _geocode_first(location_text: str):
-    """
-    Return (lat, lon) using the first result from Nominatim for the given text.
-    Cached in-process to avoid repeat lookups.
-    """
-    if not location_text:
-        return None
-
-    base = "https://nominatim.openstreetmap.org/search"
-    params = {"q": location_text, "format": "jsonv2", "limit": 1}
-    headers = {"User-Agent": "ClimbApp/1.0 (contact@climbapp.local)"}
-
-    try:
-        if requests:
-            resp = requests.get(base, params=params, headers=headers, timeout=6)
-            resp.raise_for_status()
-            data = resp.json()
-        else:
-            import urllib.parse, urllib.request, json as _json
-            url = base + "?" + urllib.parse.urlencode(params)
-            req = urllib.request.Request(url, headers=headers)
-            with urllib.request.urlopen(req, timeout=6) as f:
-                data = _json.loads(f.read().decode("utf-8"))
-        if isinstance(data, list) and data:
-            return float(data[0]["lat"]), float(data[0]["lon"])
-    except Exception:
-        # Swallow errors and just treat it as ungeocodable
-        return None
-
-    return None
-
-
+@db_routing.replica_reads
 def route_search(request):
     """
-    Public search by difficulty + distance. If a route lacks coordinates but has
-    a location text, we geocode it using the first map result (Nominatim) and
-    use that to compute distance.
+    Public search by text + difficulty + distance. `q` goes through the
+    full-text index (routes.search), filtered by difficulty in the same
+    statement, and orders results by relevance; the radius filter then
+    applies as usual and the best search.MAX_RESULTS are kept. Text-only
+    routes are geocoded when they are saved (or by `manage.py
+    backfill_route_coords`); any still lacking coordinates are resolved from
+    the geocode cache (plus, in "concurrent" mode, time-boxed lookups), and
+    otherwise land in `unknown`.
     """
     # ---- input parsing
     def as_int(val, default, lo, hi):
@@ -317,6 +280,7 @@ def route_search(request):
 
     lat = as_float("lat")
     lng = as_float("lng")
+    text = (request.GET.get("q") or "").strip()[:200]
 
     # Optional fallback to saved profile location if user is logged in
     profile_loc = None
@@ -330,17 +294,27 @@ def route_search(request):
 
     # ---- query
     from .models import Route
-    qs = Route.objects.filter(difficulty__gte=diff_min, difficulty__lte=diff_max)
-    routes_all = list(qs.select_related("author").prefetch_related("images"))
+    qs = (
+        Route.objects
+        .filter(difficulty__gte=diff_min, difficulty__lte=diff_max)
+        .select_related("author")
+        .prefetch_related("images")
+    )
 
-    # ---- helpers
-    def haversine_miles(lat1, lon1, lat2, lon2):
-        R = 3958.7613  # miles
-        phi1 = math.radians(lat1); phi2 = math.radians(lat2)
-        dphi = math.radians(lat2 - lat1); dlambda = math.radians(lon2 - lon1)
-        a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
-        return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    # Full-text match first: it narrows the candidates before any distance work.
+    # Difficulty is filtered inside the FTS statement; with a radius still to
+    # apply, nothing is capped until after it (see below).
+    relevance = None
+    if text:
+        ranked = search.ranked_route_ids(
+            text,
+            limit=None if lat is not None and lng is not None else search.MAX_RESULTS,
+            difficulty=(diff_min, diff_max),
+        )
+        relevance = {pk: i for i, pk in enumerate(ranked)}
+        qs = qs.filter(pk__in=ranked)
 
+    # ---- helpers
     def get_location_text(route):
         # Try a few common field names; adjust if your model uses a different name
         for field in ("location_name", "location", "address", "place"):
@@ -357,16 +331,37 @@ def route_search(request):
     if lat is not None and lng is not None:
         active_location = {"latitude": float(lat), "longitude": float(lng)}
 
-        for r in routes_all:
+        # Spatial prefilter in SQL: grid cells + bounding box around the search point.
+        # Only these candidates get the exact haversine check below.
+        min_lat, max_lat, min_lng, max_lng = bounding_box(float(lat), float(lng), radius)
+        nearby = qs.filter(latitude__gte=min_lat, latitude__lte=max_lat, longitude__isnull=False)
+        if min_lng is not None:
+            nearby = nearby.filter(longitude__gte=min_lng, longitude__lte=max_lng)
+        cells = cells_for_bbox(min_lat, max_lat, min_lng, max_lng)
+        if cells is not None:
+            nearby = nearby.filter(geocell__in=cells)
+
+        # Text-only routes have no coordinates to index; resolve their location
+        # text in one batch (cache only, or bounded concurrent lookups; see settings).
+        # Coordinates are stored as a pair, so latitude alone (route_lat_lng_idx) decides.
+        text_only = list(qs.filter(latitude__isnull=True))
+        resolved = geocode_many(
+            [get_location_text(r) for r in text_only],
+            allow_network=getattr(settings, "ROUTE_SEARCH_GEOCODE_MODE", "cache") == "concurrent",
+            budget=getattr(settings, "ROUTE_SEARCH_GEOCODE_BUDGET", 2.0),
+        )
+
+        for r in list(nearby) + text_only:
             rlat = getattr(r, "latitude", None)
             rlng = getattr(r, "longitude", None)
 
             if rlat is None or rlng is None:
-                # Try to geocode text-only location
+                # Not geocoded at write time yet (see backfill_route_coords);
+                # unresolved routes end up in `unknown`.
                 loc_text = get_location_text(r)
-                coords = _geocode_first(loc_text) if loc_text else None
+                coords = resolved.get(normalize_location(loc_text)) if loc_text else None
                 if coords:
-                    rlat, rlng = coords  # ephemeral; not persisted
+                    rlat, rlng = coords
 
             if rlat is not None and rlng is not None:
                 d = haversine_miles(float(rlat), float(rlng), float(lat), float(lng))
@@ -380,12 +375,22 @@ def route_search(request):
         filtered = within + unknown
     else:
         # No user location: just difficulty filter (no distance)
-        filtered = routes_all
+        filtered = list(qs)
         within = filtered
         unknown = []
 
+    if relevance is not None:
+        def by_relevance(r):
+            return relevance.get(r.pk, len(relevance))
+        within.sort(key=by_relevance)
+        unknown.sort(key=by_relevance)
+        within = within[:search.MAX_RESULTS]
+        unknown = unknown[:search.MAX_RESULTS - len(within)]
+        filtered = within + unknown if active_location else within
+
     context = {
         "routes": filtered,
+        "query": text,
         "filters": {"difficulty_min": diff_min, "difficulty_max": diff_max, "radius": radius},
         "active_location": active_location,
         "used_profile_fallback": profile_loc is not None,
@@ -396,29 +401,146 @@ def route_search(request):
     return render(request, "routes/route_search.html", context)
 
 
+def route_suggest(request):
+    """
+    Typeahead suggestions for the search box: GET ?q=<prefix>&limit=<k>.
+    Served from the in-memory prefix index (routes.typeahead), best-voted first.
+    """
+    try:
+        limit = int(request.GET.get("limit", typeahead.DEFAULT_LIMIT))
+    except (TypeError, ValueError):
+        limit = typeahead.DEFAULT_LIMIT
+    results = typeahead.suggest(request.GET.get("q", ""), limit)
+    for item in results:
+        item["url"] = reverse("routes:detail", args=[item["id"]])
+    return JsonResponse({"results": results})
+
+
+# Max markers returned per request, by zoom level (zoomed out = fewer, best-voted first)
+MAP_ROUTE_LIMITS = ((4, 150), (8, 400), (12, 800))
+MAP_ROUTE_LIMIT_MAX = 1500
+
+
+def _map_route_limit(zoom) -> int:
+    for max_zoom, limit in MAP_ROUTE_LIMITS:
+        if zoom <= max_zoom:
+            return limit
+    return MAP_ROUTE_LIMIT_MAX
+
+
+@db_routing.replica_reads
+def route_map_data(request):
+    """
+    JSON for the home map: routes inside ?bbox=west,south,east,north, trimmed
+    to compact fields and capped per zoom level (?zoom=). At low zoom levels
+    this returns server-side clusters instead (see routes.clustering).
+    """
+    try:
+        west, south, east, north = (float(v) for v in request.GET.get("bbox", "").split(","))
+        if not all(math.isfinite(v) for v in (west, south, east, north)):
+            raise ValueError
+    except ValueError:
+        return JsonResponse({"success": False, "error": "bbox must be west,south,east,north"}, status=400)
+    try:
+        zoom = int(request.GET.get("zoom", 10))
+    except (TypeError, ValueError):
+        zoom = 10
+
+    qs = Route.objects.filter(
+        latitude__gte=max(-90.0, south), latitude__lte=min(90.0, north),
+        longitude__isnull=False,
+    )
+    # Leaflet reports unwrapped longitudes once you pan past the antimeridian
+    if east - west < 360.0:
+        west = (west + 180.0) % 360.0 - 180.0
+        east = (east + 180.0) % 360.0 - 180.0
+        if west <= east:
+            qs = qs.filter(longitude__gte=west, longitude__lte=east)
+        else:
+            qs = qs.filter(Q(longitude__gte=west) | Q(longitude__lte=east))
+    else:
+        west, east = -180.0, 180.0 - 1e-9
+
+    # Repeat requests for an unchanged box get a 304 before any payload work
+    clustered = zoom <= clustering.CLUSTER_MAX_ZOOM
+    etag = conditional.map_data_etag(request, qs, clustered)
+    if etag:
+        not_modified = get_conditional_response(request, etag=quote_etag(etag))
+        if not_modified is not None:
+            return conditional.finalize(request, not_modified)
+
+    def respond(payload):
+        response = JsonResponse(payload)
+        if etag:
+            response["ETag"] = quote_etag(etag)
+        return conditional.finalize(request, response)
+
+    if clustered:
+        clusters = clustering.clusters_for_bbox(
+            west, max(-90.0, south), east, min(90.0, north), max(zoom, 0)
+        )
+        if clusters is not None:
+            return respond({"clusters": clusters, "routes": [], "truncated": False})
+
+    limit = _map_route_limit(zoom)
+    rows = list(
+        qs.annotate(net=F("upvotes") - F("downvotes"))
+        .order_by("-net", "id")
+        .values(
+            "pk", "title", "description", "difficulty", "author__username",
+            "location_name", "latitude", "longitude", "upvotes", "downvotes",
+        )[:limit + 1]
+    )
+    truncated = len(rows) > limit
+    rows = rows[:limit]
+
+    # The current user's votes/favorites for just these routes, one query each
+    user_votes = {}
+    user_favorites = set()
+    if request.user.is_authenticated and rows:
+        ids = [r["pk"] for r in rows]
+        user_votes = dict(
+            Vote.objects.filter(user=request.user, route_id__in=ids)
+            .order_by().values_list("route_id", "is_upvote")
+        )
+        user_favorites = set(
+            Favorite.objects.filter(user=request.user, route_id__in=ids)
+            .order_by().values_list("route_id", flat=True)
+        )
+
+    routes = [{
+        "pk": r["pk"],
+        "title": r["title"],
+        "description": Truncator(r["description"]).chars(160),
+        "difficulty": r["difficulty"],
+        "author": r["author__username"],
+        "location_name": r["location_name"],
+        "latitude": round(r["latitude"], 5),
+        "longitude": round(r["longitude"], 5),
+        "upvotes_count": r["upvotes"],
+        "downvotes_count": r["downvotes"],
+        "is_favorited": r["pk"] in user_favorites,
+        "user_vote": user_votes.get(r["pk"]),
+    } for r in rows]
+
+    return respond({"routes": routes, "truncated": truncated})
+
+
 @login_required
 @require_POST
 def toggle_favorite(request, pk):
     """Toggle favorite status for a route via AJAX"""
     try:
-        route = get_object_or_404(Route, pk=pk)
-        favorite, created = Favorite.objects.get_or_create(
-            user=request.user, 
-            route=route
-        )
-        
-        if not created:
-            # Favorite already existed, so remove it
-            favorite.delete()
-            is_favorited = False
-        else:
-            # New favorite was created
-            is_favorited = True
-        
+        # Insert-or-delete plus one counter UPDATE ... RETURNING (see Favorite.toggle)
+        with transaction.atomic():
+            is_favorited, counters = Favorite.toggle(request.user, pk)
+            if counters is None:
+                raise Http404("No Route matches the given query.")
+
         return JsonResponse({
             'success': True,
             'is_favorited': is_favorited,
-            'favorites_count': route.favorites.count()
+            'favorites_count': counters["favorites_count"]
         })
     except Exception as e:
         return JsonResponse({
@@ -427,44 +549,59 @@ def toggle_favorite(request, pk):
         }, status=400)
 
 
+@login_required
+@require_POST
+def bulk_interactions(request):
+    """
+    Apply queued votes/favorites in one transaction (see routes.interactions).
+    Body: {"operations": [{"route": <id>, "action": "upvote", "at": "<ISO 8601>"}, ...]}
+    """
+    try:
+        payload = json.loads(request.body)
+    except (UnicodeDecodeError, ValueError):
+        return JsonResponse({"success": False, "error": "Body must be JSON."}, status=400)
+    operations = payload.get("operations") if isinstance(payload, dict) else None
+    if not isinstance(operations, list):
+        return JsonResponse({"success": False, "error": "operations must be a list."}, status=400)
+    if len(operations) > interactions.MAX_OPERATIONS:
+        return JsonResponse({
+            "success": False,
+            "error": f"At most {interactions.MAX_OPERATIONS} operations per request.",
+        }, status=400)
+
+    results, routes = interactions.apply_operations(request.user, operations)
+    for pk, state in routes.items():
+        typeahead.update_score(pk, state["net_votes"])
+    return JsonResponse({
+        "success": True,
+        "results": results,
+        "routes": {str(pk): state for pk, state in routes.items()},
+    })
+
+
 @login_required
 @require_POST
 def vote_route(request, pk):
     """Handle upvote/downvote for a route via AJAX"""
     try:
-        route = get_object_or_404(Route, pk=pk)
         is_upvote = request.POST.get('is_upvote') == 'true'
-        
-        # Get or create the vote
-        vote, created = Vote.objects.get_or_create(
-            user=request.user,
-            route=route,
-            defaults={'is_upvote': is_upvote}
-        )
-        
-        if not created:
-            if vote.is_upvote == is_upvote:
-                # User clicked the same vote type - remove the vote
-                vote.delete()
-                user_vote = None
-            else:
-                # User switched vote type
-                vote.is_upvote = is_upvote
-                vote.save()
-                user_vote = is_upvote
-        else:
-            # New vote created
-            user_vote = is_upvote
-        
+        # Usually two statements: the vote write and the counter UPDATE ... RETURNING
+        with transaction.atomic():
+            user_vote, counters = Vote.toggle(request.user, pk, is_upvote)
+            if counters is None:
+                raise Http404("No Route matches the given query.")
+        net_votes = counters["upvotes"] - counters["downvotes"]
+        typeahead.update_score(pk, net_votes)
+
         return JsonResponse({
             'success': True,
             'user_vote': user_vote,  # None, True (upvote), or False (downvote)
-            'upvotes_count': route.get_upvotes_count(),
-            'downvotes_count': route.get_downvotes_count(),
-            'net_votes': route.get_net_votes()
+            'upvotes_count': counters["upvotes"],
+            'downvotes_count': counters["downvotes"],
+            'net_votes': net_votes
         })
     except Exception as e:
         return JsonResponse({
             'success': False,
             'error': str(e)
-        }, status=400)
\ No newline at end of file
+        }, status=400)